@@ -0,0 +1,210 @@
+'''Run Benchmark'''
+
+import argparse
+import contextlib
+import importlib.util
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from Benchmarks.SharedconfigGenerator import write_sharedconfig
+from Benchmarks.StubServer import StubServer
+
+SCRIPT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "ProtonDB-Tags.py")
+
+# Most seconds importing the script may take, offline runs shouldn't load anything else
+STARTUP_TARGET_SECONDS = 0.2
+
+
+def run_case(case: dict) -> dict:
+    '''Runs main() once for the case, in this process.\n
+       Returns the wall time, time spent importing the script, time spent saving the caches,
+       the peak memory used, and if requests was imported.'''
+
+    startup_start = time.perf_counter()
+    spec = importlib.util.spec_from_file_location("protondb_tags", SCRIPT_PATH)
+    protondb_tags = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(protondb_tags)
+    startup_time = time.perf_counter() - startup_start
+
+    # Already imported by the script, so this doesn't count towards the startup time
+    tag_engine = importlib.import_module("Utils.TagEngine")
+    tag_engine.PROTONDB_URL = case["protondb_url"]
+    tag_engine.STEAM_STORE_URL = case["steam_url"]
+
+    save_time = [0.0]
+    save_caches = protondb_tags.CacheManager.save_caches
+
+    def timed_save_caches(self):
+        save_start = time.perf_counter()
+        save_caches(self)
+        save_time[0] += time.perf_counter() - save_start
+
+    protondb_tags.CacheManager.save_caches = timed_save_caches
+
+    arguments = ["--sharedconfig", case["sharedconfig_path"], "--no-save",
+        "--workers", str(case["workers"])]
+    if case["check_native"]:
+        arguments.append("--check-native")
+    if case["offline"]:
+        arguments.append("--offline")
+    args = protondb_tags.get_argument_parser().parse_args(arguments)
+
+    with open(os.devnull, mode="w", encoding="utf-8") as devnull:
+        with contextlib.redirect_stdout(devnull):
+            start_time = time.perf_counter()
+            protondb_tags.main(args)
+            wall_time = time.perf_counter() - start_time
+
+    return {
+        "wall_time": wall_time,
+        "startup_time": startup_time,
+        "cache_save_time": save_time[0],
+        # Kilobytes on Linux
+        "peak_memory_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "requests_imported": "requests" in sys.modules,
+    }
+
+
+def run_case_process(case: dict, env: dict) -> dict:
+    '''Runs the case in a new process, so the peak memory is only for that case.'''
+
+    result = subprocess.run([sys.executable, "-m", "Benchmarks.RunBenchmark", "--case",
+        json.dumps(case)], env=env, check=True, stdout=subprocess.PIPE,
+        cwd=os.path.dirname(SCRIPT_PATH))
+
+    return json.loads(result.stdout.decode("utf-8").splitlines()[-1])
+
+
+def run_benchmarks(args) -> list:
+    '''Runs each size with a cold cache, then a warm cache, and then offline with the warm cache,
+       against local stub servers.'''
+
+    protondb_server = StubServer(latency=args.latency, error_rate=args.error_rate,
+        rate_limit=args.rate_limit)
+    steam_server = StubServer(latency=args.latency, error_rate=args.error_rate,
+        rate_limit=args.rate_limit, reject_batches=args.reject_batches)
+    protondb_server.start()
+    steam_server.start()
+
+    results = []
+
+    try:
+        for size in args.sizes:
+            with tempfile.TemporaryDirectory(prefix="protondb-tags-benchmark-") as temp_path:
+                sharedconfig_path = os.path.join(temp_path, "sharedconfig.vdf")
+                write_sharedconfig(sharedconfig_path, size, args.variant)
+
+                # Nothing from the real cache or config is used
+                env = dict(os.environ)
+                env["XDG_CACHE_HOME"] = os.path.join(temp_path, "cache")
+                env["XDG_CONFIG_HOME"] = os.path.join(temp_path, "config")
+                os.makedirs(env["XDG_CACHE_HOME"])
+                os.makedirs(env["XDG_CONFIG_HOME"])
+
+                case = {
+                    "sharedconfig_path": sharedconfig_path,
+                    "protondb_url": protondb_server.get_url(),
+                    "steam_url": steam_server.get_url(),
+                    "workers": args.workers,
+                    "check_native": args.check_native,
+                }
+
+                for cache in ["cold", "warm", "offline"]:
+                    case["offline"] = cache == "offline"
+                    result = run_case_process(case, env)
+                    requests_made = protondb_server.get_stats()["requests"] + \
+                        steam_server.get_stats()["requests"]
+
+                    result.update({"apps": size, "cache": cache, "requests": requests_made,
+                        "requests_per_second": requests_made / max(result["wall_time"], 1e-9)})
+                    results.append(result)
+                    print_result(result)
+    finally:
+        protondb_server.stop()
+        steam_server.stop()
+
+    return results
+
+
+def print_result(result: dict) -> None:
+    '''Prints a row of the results table.'''
+
+    print(f"{result['apps']:>8} {result['cache']:>7} {result['wall_time']:>10.2f}s " + \
+        f"{result['startup_time']:>7.3f}s {result['requests']:>9} " + \
+        f"{result['requests_per_second']:>10.1f} {result['cache_save_time']:>10.2f}s " + \
+        f"{result['peak_memory_mb']:>9.1f}MB")
+
+
+def check_startup(results: list) -> list:
+    '''Checks the offline runs against STARTUP_TARGET_SECONDS, returns a list of failures.'''
+
+    failures = []
+
+    for result in results:
+        if result["cache"] != "offline":
+            continue
+
+        if result["startup_time"] > STARTUP_TARGET_SECONDS:
+            failures.append(f"{result['apps']} apps: importing the script took " + \
+                f"{result['startup_time']:.3f}s, the target is {STARTUP_TARGET_SECONDS}s.")
+        if result["requests"] or result["requests_imported"]:
+            failures.append(f"{result['apps']} apps: the offline run made requests " + \
+                "or imported requests.")
+
+    return failures
+
+
+def main(args) -> None:
+    '''Main entry point into the benchmark.'''
+
+    if args.case:
+        print(json.dumps(run_case(json.loads(args.case))))
+        return
+
+    print(f"{'apps':>8} {'cache':>7} {'wall time':>11} {'startup':>8} {'requests':>9} " + \
+        f"{'requests/s':>10} {'cache save':>11} {'peak memory':>11}")
+
+    results = run_benchmarks(args)
+
+    if args.json_path:
+        with open(args.json_path, mode="w", encoding="utf-8") as json_file:
+            json.dump(results, json_file, indent=2)
+
+    failures = check_startup(results)
+    for failure in failures:
+        print(failure)
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    # Usage: python -m Benchmarks.RunBenchmark --sizes 1000 10000
+    PARSER = argparse.ArgumentParser(
+        description="Benchmarks ProtonDB-Tags against a local stand-in for the APIs.")
+    PARSER.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+        help="Number of apps in each sharedconfig to benchmark")
+    PARSER.add_argument("--variant", type=int, default=0,
+        help="Which spelling of the sharedconfig keys to use, see SharedconfigGenerator")
+    PARSER.add_argument("--workers", type=int, default=8, help="Number of workers to run with")
+    PARSER.add_argument("--check-native", action="store_true",
+        help="Check for native Linux support as well")
+    PARSER.add_argument("--latency", type=float, default=0.0,
+        help="Seconds the stub servers wait before each response")
+    PARSER.add_argument("--error-rate", type=float, default=0.0,
+        help="Fraction of requests the stub servers fail with 503")
+    PARSER.add_argument("--rate-limit", type=int, default=0,
+        help="Requests each stub server allows each second before responding with 429")
+    PARSER.add_argument("--reject-batches", action="store_true",
+        help="Reject appdetails requests for more than one app, like the real API can")
+    PARSER.add_argument("--json", dest="json_path", default=None,
+        help="Write the results to this JSON file as well")
+    PARSER.add_argument("--case", default=None, help=argparse.SUPPRESS)
+
+    main(PARSER.parse_args())
@@ -0,0 +1,99 @@
+'''Sharedconfig Generator'''
+
+import argparse
+import os
+import random
+
+import vdf
+
+# Every spelling of the keys which get_apps_list looks for, from the root down to the apps
+KEY_VARIANTS = [
+    ("UserRoamingConfigStore", "UserLocalConfigStore"),
+    ("Software", "software"),
+    ("Valve", "valve"),
+    ("Steam", "steam"),
+    ("Apps", "apps"),
+]
+
+VARIANT_COUNT = 2 ** len(KEY_VARIANTS)
+
+_OTHER_TAGS = ["favorite", "Backlog", "Co-op", "Finished"]
+_RANKS = ["ProtonDB Ranking: 0 Native", "ProtonDB Ranking: 1 Platinum", "ProtonDB Ranking: 2 Gold",
+    "ProtonDB Ranking: 3 Silver", "ProtonDB Ranking: 6 Unrated", "ProtonDB Ranking: 7 Borked"]
+
+
+def get_variant_keys(variant: int) -> list:
+    '''Gets the keys used for the variant, each bit picks the spelling of one of the keys.'''
+
+    return [keys[(variant >> position) & 1] for position, keys in enumerate(KEY_VARIANTS)]
+
+
+def generate_app(app_id: int, rand: random.Random) -> dict:
+    '''Generates the settings for an app, with one of the kinds of tags seen in real sharedconfigs:
+       no tags, other tags, an existing ranking, duplicate rankings, or an empty tags value.'''
+
+    app = {"LastPlayed": str(1600000000 + rand.randrange(100000000))}
+    kind = app_id % 6
+
+    if kind == 1:
+        app["tags"] = {"0": rand.choice(_OTHER_TAGS)}
+    elif kind == 2:
+        app["tags"] = {"0": rand.choice(_OTHER_TAGS), "1": rand.choice(_RANKS)}
+    elif kind == 3:
+        app["tags"] = {"0": rand.choice(_RANKS), "1": rand.choice(_OTHER_TAGS),
+            "2": rand.choice(_RANKS)}
+    elif kind == 4:
+        app["tags"] = ""
+    elif kind == 5:
+        app["cloudenabled"] = "1"
+        app["tags"] = {}
+
+    return app
+
+
+def generate_sharedconfig(app_count: int, variant: int = 0, seed: int = 0) -> dict:
+    '''Generates a sharedconfig with app_count apps, using the key spelling for the variant.\n
+       About 1% of the apps have IDs which aren't numbers, the same as some Steam shortcuts.'''
+
+    rand = random.Random(seed)
+    apps = {}
+
+    for app_id in rand.sample(range(10, 3000000, 10), app_count):
+        if rand.random() < 0.01:
+            apps[f"Benchmark_{app_id}"] = {"tags": {"0": rand.choice(_OTHER_TAGS)}}
+        else:
+            apps[str(app_id)] = generate_app(app_id // 10, rand)
+
+    (configstore, software, valve, steam, apps_key) = get_variant_keys(variant)
+    return {configstore: {software: {valve: {steam: {
+        "SteamDefaultDialog": "#app_games",
+        apps_key: apps,
+        "LastPlayedTimesSyncTime": "1600000000",
+    }}}}}
+
+
+def write_sharedconfig(path: str, app_count: int, variant: int = 0, seed: int = 0) -> None:
+    '''Generates a sharedconfig and writes it to the path, the same way Steam formats it.'''
+
+    with open(path, mode="w", encoding="utf-8") as sharedconfig_file:
+        vdf.dump(generate_sharedconfig(app_count, variant, seed), sharedconfig_file, pretty=True)
+
+
+if __name__ == "__main__":
+    # Usage: python -m Benchmarks.SharedconfigGenerator --sizes 1000 10000 --output ./benchmark
+    PARSER = argparse.ArgumentParser(description="Generates sharedconfigs for benchmarking.")
+    PARSER.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+        help="Number of apps in each sharedconfig")
+    PARSER.add_argument("--all-variants", action="store_true",
+        help="Write a sharedconfig for every spelling of the keys, instead of only the first")
+    PARSER.add_argument("--seed", type=int, default=0, help="Seed for the random apps")
+    PARSER.add_argument("--output", default=".", help="Directory to write the sharedconfigs to")
+    ARGUMENTS = PARSER.parse_args()
+
+    os.makedirs(ARGUMENTS.output, exist_ok=True)
+    for size in ARGUMENTS.sizes:
+        for size_variant in range(VARIANT_COUNT if ARGUMENTS.all_variants else 1):
+            output_path = os.path.join(ARGUMENTS.output,
+                f"sharedconfig-{size}-{size_variant:02d}.vdf")
+            write_sharedconfig(output_path, size, size_variant, ARGUMENTS.seed)
+            print(f"Wrote {output_path}")
@@ -0,0 +1,224 @@
+'''Stub Server'''
+
+import argparse
+import collections
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+_TIERS = ["platinum", "gold", "silver", "bronze", "pending", "borked"]
+_RE_SUMMARY = re.compile(r"^/api/v1/reports/summaries/(\d+)\.json$")
+
+
+def get_stub_tier(app_id: int) -> str:
+    '''Gets the tier the stub server gives an app, or None if ProtonDB wouldn't know about it.'''
+
+    if app_id % 19 == 0:
+        return None
+
+    return _TIERS[(app_id * 7) % len(_TIERS)]
+
+
+def get_stub_appdetails(app_id: str) -> dict:
+    '''Gets the appdetails the stub server gives an app, about a quarter of them are native.'''
+
+    if not app_id.isdigit() or int(app_id) % 19 == 0:
+        return {"success": False}
+
+    is_native_game = int(app_id) % 7 < 2
+    return {"success": True, "data": {"platforms": {
+        "windows": True, "mac": False, "linux": is_native_game}}}
+
+
+class _StubRequestHandler(BaseHTTPRequestHandler):
+    '''private: Answers requests the same way as the ProtonDB and Steam appdetails APIs.'''
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args): # pylint: disable=redefined-builtin
+        pass
+
+
+    def _send_json(self, status_code: int, body, headers: dict = None) -> None:
+        '''private: Sends the response, body is encoded as JSON unless it is None.'''
+
+        data = b"" if body is None else json.dumps(body).encode("utf-8")
+
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+        self.server.count_response(status_code)
+
+
+    def _get_summary(self, app_id: int) -> None:
+        '''private: Sends the ProtonDB summary, or 304 if the client already has it.'''
+
+        tier = get_stub_tier(app_id)
+        if tier is None:
+            self._send_json(404, None)
+            return
+
+        etag = f'"{app_id}-{tier}"'
+        if self.headers.get("If-None-Match") == etag:
+            self._send_json(304, None, {"ETag": etag})
+            return
+
+        self._send_json(200, {"bestReportedTier": tier, "confidence": "strong", "score": 0.5,
+            "tier": tier, "total": app_id % 100, "trendingTier": tier}, {"ETag": etag})
+
+
+    def _get_appdetails(self, query: dict) -> None:
+        '''private: Sends the Steam appdetails for one or more apps.'''
+
+        app_ids = ",".join(query.get("appids", [])).split(",")
+
+        # The real API doesn't support every filter with more than one app, and returns null
+        if len(app_ids) > 1 and self.server.reject_batches:
+            self._send_json(400, None)
+            return
+
+        self._send_json(200, {app_id: get_stub_appdetails(app_id) for app_id in app_ids})
+
+
+    def do_GET(self): # pylint: disable=invalid-name
+        '''Handles a GET request, after the configured latency, errors and rate limit.'''
+
+        if self.server.latency > 0:
+            time.sleep(self.server.latency)
+
+        if not self.server.try_acquire():
+            self._send_json(429, None, {"Retry-After": "1"})
+            return
+
+        if self.server.error_rate > 0 and random.random() < self.server.error_rate:
+            self._send_json(503, None)
+            return
+
+        url = urlparse(self.path)
+        summary_match = _RE_SUMMARY.match(url.path)
+
+        if summary_match:
+            self._get_summary(int(summary_match.group(1)))
+        elif url.path == "/api/appdetails":
+            self._get_appdetails(parse_qs(url.query))
+        else:
+            self._send_json(404, None)
+
+
+class StubServer(ThreadingHTTPServer): # pylint: disable=too-many-instance-attributes
+    '''Local stand-in for the ProtonDB and Steam store APIs, for benchmarking without the network.\n
+       latency is the seconds to wait before each response, error_rate is the fraction of requests
+       which fail with 503, and rate_limit is how many requests are allowed each second before
+       responding with 429 (0 for no limit).'''
+
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, latency: float = 0.0, error_rate: float = 0.0,
+        rate_limit: int = 0, reject_batches: bool = False):
+        '''Init, port 0 picks any free port.'''
+
+        super().__init__(("127.0.0.1", port), _StubRequestHandler)
+
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.reject_batches = reject_batches
+
+        self._lock = threading.Lock()
+        self._request_times = collections.deque()
+        self._status_counts = {}
+        self._thread = None
+
+
+    def handle_error(self, request, client_address):
+        '''Clients which time out close the connection before the response is sent,
+           which is expected when testing with latency.'''
+
+
+    def get_url(self) -> str:
+        '''Gets the base URL of the server.'''
+
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+    def try_acquire(self) -> bool:
+        '''Returns False if the request is over the rate limit.'''
+
+        if self.rate_limit <= 0:
+            return True
+
+        now = time.monotonic()
+        with self._lock:
+            while self._request_times and self._request_times[0] <= now - 1.0:
+                self._request_times.popleft()
+
+            if len(self._request_times) >= self.rate_limit:
+                return False
+
+            self._request_times.append(now)
+            return True
+
+
+    def count_response(self, status_code: int) -> None:
+        '''Counts a response sent with the status code.'''
+
+        with self._lock:
+            self._status_counts[status_code] = self._status_counts.get(status_code, 0) + 1
+
+
+    def get_stats(self) -> dict:
+        '''Gets the number of responses sent with each status code, and resets them.'''
+
+        with self._lock:
+            status_counts = dict(sorted(self._status_counts.items()))
+            self._status_counts = {}
+
+        return {"requests": sum(status_counts.values()), "status_codes": status_counts}
+
+
+    def start(self) -> None:
+        '''Starts serving requests in a background thread.'''
+
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+
+
+    def stop(self) -> None:
+        '''Stops the server started with start.'''
+
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
+
+
+if __name__ == "__main__":
+    # Usage: python -m Benchmarks.StubServer --port 8080 --latency 0.05
+    PARSER = argparse.ArgumentParser(description="Local stand-in for the ProtonDB and Steam APIs.")
+    PARSER.add_argument("--port", type=int, default=8080, help="Port to listen on")
+    PARSER.add_argument("--latency", type=float, default=0.0,
+        help="Seconds to wait before each response")
+    PARSER.add_argument("--error-rate", type=float, default=0.0,
+        help="Fraction of requests which fail with 503")
+    PARSER.add_argument("--rate-limit", type=int, default=0,
+        help="Requests allowed each second before responding with 429, 0 for no limit")
+    PARSER.add_argument("--reject-batches", action="store_true",
+        help="Reject appdetails requests for more than one app, like the real API can")
+    ARGUMENTS = PARSER.parse_args()
+
+    SERVER = StubServer(ARGUMENTS.port, ARGUMENTS.latency, ARGUMENTS.error_rate,
+        ARGUMENTS.rate_limit, ARGUMENTS.reject_batches)
+    print(f"Serving on {SERVER.get_url()}")
+
+    try:
+        SERVER.serve_forever()
+    except KeyboardInterrupt:
+        SERVER.server_close()
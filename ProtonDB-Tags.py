@@ -2,360 +2,256 @@
 '''ProtonDB Tags'''
 
 import argparse
+import logging
+import os
+import signal
+import threading
 import time
-import requests
 
 from Utils.CacheManager import CacheManager
 from Utils.ConfigManager import ConfigManager
-from Utils.SharedconfigManager import SharedconfigManager
+from Utils.MetricsManager import MetricsManager
+from Utils.ReportsManager import ReportsManager
+from Utils.TagEngine import SteamAPIError, TagEngine
+from Utils.TagPlanner import APP_ORDERS, export_changes
+from Utils.TagRun import TagRun
 
 
-class ProtonDBError(Exception):
-    '''If ProtonDB returns an error or rate limits us, we will throw this exception.'''
+def get_owned_games(args, tag_engine: TagEngine) -> list:
+    '''Gets the app IDs of the games on your account from the Steam API,
+       asking for your Steam ID and API key if they haven't been set up yet.\n
+       Returns None if there is a problem with the Steam API.'''
 
-
-def is_native(app_id: str, skip_cache: bool, cache_manager: CacheManager) -> bool:
-    '''Checks if the game has Native Linux support from the Steam Store API.'''
-
-    if not skip_cache:
-        (found_in_cache, value) = cache_manager.get_from_steam_native_cache(app_id)
-        if found_in_cache:
-            return value
-
-    # Thanks to u/FurbyOnSteroid for finding this!
-    # https://www.reddit.com/r/linux_gaming/comments/bxqsvs/protondb_to_steam_library_tool/eqal68r/
-    api_url = f"https://store.steampowered.com/api/appdetails?appids={app_id}&filters=platforms"
-    steam_response = None
-    is_native_game = False
+    config_manager = ConfigManager()
 
     try:
-        steam_response = requests.get(
-            api_url,
-            timeout=3,
-            headers={"User-Agent": "https://github.com/CorruptComputer/ProtonDB-Tags"}
-        )
-    except requests.Timeout:
-        print(f"{app_id} | Timed out reading Steam store page.")
-    except requests.ConnectionError:
-        print(f"{app_id} | Could not connect to Steam.")
-    except requests.RequestException as e:
-        print(f"{app_id} | An unknown error occoured with the request to Steam. {type(e).__name__}")
-
-    # Wait 1.3 seconds before continuing, as Steam only allows 10 requests per 10 seconds,
-    # otherwise you get rate limited for a few minutes.
-    time.sleep(1.3)
+        return tag_engine.owned_games(config_manager.get_steam_id(),
+            config_manager.get_steam_api_key, args.owned_games_ttl)
+    except SteamAPIError:
+        config_manager.clear_config()
+        return None
 
-    if steam_response:
-        if steam_response.status_code != 200:
-            print(f"{app_id} | Error reading Steam store info for game.")
-            return False
 
-        steam_api_json = steam_response.json()
+def set_interrupt_handler(tag_run: TagRun) -> dict:
+    '''Makes Ctrl+C or being killed save the checkpoint and caches before exiting,
+       so the run can be resumed with --resume.\n
+       Returns the previous handlers for restore_interrupt_handler.'''
 
-        # If steam can't find the game it will be False
-        is_success = steam_api_json[app_id]["success"]
-        is_native_game = False
+    # Signal handlers can only be set from the main thread
+    if threading.current_thread() is not threading.main_thread():
+        return {}
 
-        if is_success in ["True", "true", True]:
-            linux_support = steam_api_json[app_id]["data"]["platforms"]["linux"]
-            is_native_game = linux_support in ["True", "true", True]
+    def save_progress(signal_number: int, _) -> None:
+        tag_run.save_progress()
 
-        cache_manager.add_to_steam_native_cache(app_id, is_native_game)
-    else:
-        # give a 1 day cooldown to reduce server load and speed when retrying after a long run
-        cache_manager.add_to_steam_native_cache(app_id, is_native_game, 1, 0)
+        print("\nInterrupted, the progress so far has been saved. " + \
+            "Run again with --resume to carry on from here.", flush=True)
 
-    return is_native_game
+        # Exits straight away, without waiting for the fetches which haven't started yet
+        os._exit(128 + signal_number) # pylint: disable=protected-access
 
+    return {signal_number: signal.signal(signal_number, save_progress)
+        for signal_number in (signal.SIGINT, signal.SIGTERM)}
 
-def get_key_value(possible_keys, dict_to_check: dict) -> str:
-    '''Finds which key exists in the dict.\n
-       If none of the values are found the first will be taken as a default.\n
-       possible_keys should be of type str[]'''
 
-    found_key = "Not found"
-    for key in possible_keys:
-        if key in dict_to_check:
-            found_key = key
+def restore_interrupt_handler(previous_handlers: dict) -> None:
+    '''Puts back the handlers from before set_interrupt_handler.'''
 
-    if found_key == "Not found":
-        found_key = possible_keys[0]
-        dict_to_check[found_key] = {}
+    for signal_number, handler in previous_handlers.items():
+        signal.signal(signal_number, handler)
 
-    return found_key
 
+def write_metrics(args, metrics_manager: MetricsManager, tag_engine: TagEngine) -> None:
+    '''Writes the metrics for the run to the files from the arguments, if there are any.'''
 
-def get_apps_list(sharedconfig: dict, fetch_games: bool) -> dict:
-    '''Searches the sharedconfig to get a list of Steam app IDs.\n
-       Optionally can query the Steam API to check for games as well.'''
+    if not args.metrics_path and not args.metrics_prometheus_path:
+        return
 
-    # If neither value is found, the first will be taken as a default and initialized to {}
-    configstore = get_key_value(["UserRoamingConfigStore", "UserLocalConfigStore"], sharedconfig)
-    software = get_key_value(["Software", "software"], sharedconfig[configstore])
-    valve = get_key_value(["Valve", "valve"], sharedconfig[configstore][software])
-    steam = get_key_value(["Steam", "steam"], sharedconfig[configstore][software][valve])
-    apps = get_key_value(["Apps", "apps"], sharedconfig[configstore][software][valve][steam])
+    # There is no HTTP client if no requests could be made
+    http_client = tag_engine.get_http_client()
+    metrics = metrics_manager.get_metrics(tag_engine.get_cache_manager().get_stats(),
+        http_client.get_stats() if http_client else {})
 
-    apps_list = sharedconfig[configstore][software][valve][steam][apps]
+    if args.metrics_path:
+        metrics_manager.write_json(args.metrics_path, metrics)
+    if args.metrics_prometheus_path:
+        metrics_manager.write_prometheus(args.metrics_prometheus_path, metrics)
 
-    if fetch_games:
-        config_manager = ConfigManager()
-        api_key = config_manager.get_steam_api_key()
-        steam_id = config_manager.get_steam_id()
 
-        api_url = "https://api.steampowered.com/IPlayerService/GetOwnedGames/v0001/" + \
-            f"?key={api_key}" + \
-            f"&steamid={steam_id}" + \
-            "&include_played_free_games=true" + \
-            "&skip_unvetted_apps=false" + \
-            "&include_free_sub=true" + \
-            "&format=json"
+class PrintHandler(logging.Handler):
+    '''Shows the messages logged by the engine and managers the same way as the rest of the
+       output, so they go wherever print would.'''
 
-        get_owned_games_result = None
+    def emit(self, record: logging.LogRecord) -> None:
+        print(self.format(record))
 
-        try:
-            get_owned_games_result = requests.get(
-                api_url,
-                timeout=3,
-                headers={"User-Agent": "https://github.com/CorruptComputer/ProtonDB-Tags"}
-            )
-        except requests.Timeout:
-            print("Timed out reading apps list from Steam.")
-        except requests.ConnectionError:
-            print("Could not connect to Steam.")
-        except requests.RequestException as e:
-            print(f"An unknown error occoured with the request to Steam. {type(e).__name__}")
 
-        if not get_owned_games_result:
-            return apps_list
+def set_up_logging() -> None:
+    '''Prints the messages logged from Utils, this is only done once however many times main
+       is called.'''
 
-        if get_owned_games_result.status_code != 200:
-            print("There was a problem retreiving your games list from the Steam API, " + \
-                f"status code was: {get_owned_games_result.status_code}")
+    utils_logger = logging.getLogger("Utils")
+    if not any(isinstance(handler, PrintHandler) for handler in utils_logger.handlers):
+        utils_logger.addHandler(PrintHandler())
+        utils_logger.setLevel(logging.INFO)
+        utils_logger.propagate = False
 
-            if get_owned_games_result.status_code == 401:
-                print("A 401 status code usually means authentication failure, " + \
-                    "your API key is most likely invalid.")
-            elif get_owned_games_result.status_code == 500:
-                print("A 500 status code usually means server error, " + \
-                    "your steamID64 may be invalid or Steam is currently down.")
 
-            config_manager.clear_config()
-            return apps_list
+def main(args) -> None:
+    '''Main entry point into the script.'''
 
-        owned_games_json = get_owned_games_result.json()["response"]
-        new_games = 0
+    set_up_logging()
+    metrics_manager = MetricsManager()
 
-        if "games" not in owned_games_json:
-            print("\nNo games returned by the Steam API for your account. " + \
-                "This usually means that your profile and games list are set to private.")
+    # The run stops fetching ratings after --max-seconds, only tagging what it has so far
+    args.deadline = None
+    if args.max_seconds is not None:
+        args.deadline = time.monotonic() + args.max_seconds
 
-            print("If you are uncomfortable having a public profile, don't worry. " + \
-                "This only needs to be public for long enough to run the script.")
+    if args.clear_config:
+        config_manager = ConfigManager()
+        config_manager.clear_config()
 
-            print("\nThese settings can be changed here: " + \
-                "https://steamcommunity.com/my/edit/settings")
+    if args.ingest_reports:
+        cache_manager = CacheManager()
+        reports_manager = ReportsManager(
+            os.path.join(cache_manager.get_base_cache_path(), "protonDBReports.idx"))
 
-            return apps_list
+        print(f"\nReading ProtonDB reports from: {args.ingest_reports}")
+        reports_manager.ingest(args.ingest_reports)
+        return
 
+    if args.export_cache or args.import_cache:
+        cache_manager = CacheManager()
 
-        for game in owned_games_json["games"]:
-            if str(game["appid"]) not in apps_list:
-                apps_list[str(game["appid"])] = {}
-                apps_list[str(game["appid"])]["tags"] = {}
-                new_games += 1
+        if args.import_cache:
+            try:
+                imported = cache_manager.import_caches(args.import_cache)
+                print(f"\nImported {imported} cache entries from: {args.import_cache}")
+            except ValueError as e:
+                print(f"\n{e}")
 
-        print(f"Found {new_games} new games from the Steam API.")
+        if args.export_cache:
+            exported = cache_manager.export_caches(args.export_cache)
+            print(f"\nExported {exported} cache entries to: {args.export_cache}")
 
-    return apps_list
+        return
 
+    if args.offline and args.fetch_games:
+        print("The games list can't be fetched from the Steam API offline, " + \
+            "so --fetch-games is ignored with --offline.")
+        args.fetch_games = False
 
-def get_protondb_rating(app_id: str, skip_cache: bool, cache_manager: CacheManager) -> str:
-    '''Gets the rating for the game from ProtonDB's API.
-       Defaults to 'unrated' if there is a problem with the ProtonDB API.'''
+    tag_engine = TagEngine({option: getattr(args, option) for option in [
+        "check_native", "skip_cache", "stale_ok", "offline", "use_reports", "workers",
+        "deadline", "protondb_rate_limit"]})
+    tag_run = TagRun(tag_engine, {option: getattr(args, option) for option in [
+        "order", "incremental", "resume", "refresh_budget", "refresh_window"]}, metrics_manager)
+    sharedconfig_manager = tag_engine.get_sharedconfig_manager()
 
-    if not skip_cache:
-        (found_in_cache, value) = cache_manager.get_from_protondb_cache(app_id)
-        if found_in_cache:
-            return value
+    sharedconfig_paths = [args.sharedconfig_path]
+    if args.all_users:
+        sharedconfig_paths = sharedconfig_manager.find_all_sharedconfigs()
 
-    # For example, Warframe: https://www.protondb.com/api/v1/reports/summaries/230410.json
-    api_url = f"https://www.protondb.com/api/v1/reports/summaries/{app_id}.json"
-    protondb_response = None
-    protondb_ranking = "unrated"
+        if args.fetch_games:
+            print("The games list from the Steam API is only for your account, " + \
+                "so --fetch-games is ignored with --all-users.")
+            args.fetch_games = False
 
-    try:
-        protondb_response = requests.get(
-            api_url,
-            timeout=3,
-            headers={"User-Agent": "https://github.com/CorruptComputer/ProtonDB-Tags"}
-        )
-    except requests.Timeout:
-        print(f"{app_id} | Timed out reading the ranking from ProtonDB")
-    except requests.ConnectionError:
-        print(f"{app_id} | Could not connect to ProtonDB.")
-    except requests.RequestException as e:
-        print(f"{app_id} | An unknown error occoured with the request to ProtonDB. " \
-            + f"{type(e).__name__}")
-
-    if protondb_response:
-        if protondb_response.status_code == 200:
-            protondb_data = protondb_response.json()
-            protondb_ranking = protondb_data["trendingTier"]
-
-        cache_manager.add_to_protondb_cache(app_id, protondb_ranking)
-    else:
-        # give a 1 day cooldown to reduce server load and speed when retrying after a long run
-        cache_manager.add_to_protondb_cache(app_id, protondb_ranking, 1, 0)
-
-    return protondb_ranking
-
-
-def get_tag_number(app: dict) -> str:
-    '''Checks for an existing ProtonDB Rating tag,
-       if it doesn't have one it finds the next available tag number to add for the game.'''
-
-    tag_num = None
-
-    if "tags" in app and isinstance(app["tags"], dict):
-        # Have to create a copy to avoid: "RuntimeError: dictionary changed size during iteration"
-        tags = app["tags"].copy()
-        for tag in tags:
-            # Search to see if a ProtonDB rank is already a tag, if so just overwrite that tag
-            if app["tags"][tag].startswith("ProtonDB Ranking:", 0, 17):
-                if not tag_num:
-                    tag_num = tag
-                else:
-                    # Delete dupe tags caused by error of previous versions,
-                    # may remove this check in the future once its no longer an issue
-                    del app["tags"][tag]
-        if not tag_num:
-            # If no ProtonDB tags were found, use the next available number
-            tag_num = str(len(app["tags"]))
-
-    # If the tags key wasn't found, that means there are no tags for the game
-    else:
-        tag_num = "0"
-        app["tags"] = {}
-
-    return tag_num
+    tag_run.load_sharedconfigs(sharedconfig_paths, sharedconfig_manager.get_sharedconfig)
 
+    owned_games = None
+    if args.fetch_games:
+        with metrics_manager.phase("app_list"):
+            owned_games = get_owned_games(args, tag_engine)
 
-def main(args) -> None:
-    '''Main entry point into the script.'''
+    # Ctrl+C saves the progress so far, so the run can be resumed
+    previous_handlers = set_interrupt_handler(tag_run)
+    start_time = time.time()
+    change_sets = tag_run.tag(owned_games)
+    app_count = tag_run.get_app_count()
 
-    if args.clear_config:
-        config_manager = ConfigManager()
-        config_manager.clear_config()
+    # Nothing found or nothing changed, just stop here since there is nothing to do.
+    if app_count == 0 and not args.watch:
+        restore_interrupt_handler(previous_handlers)
+        write_metrics(args, metrics_manager, tag_engine)
+        return
 
-    sharedconfig_manager = SharedconfigManager()
-    (sharedconfig_path, sharedconfig) = \
-        sharedconfig_manager.get_sharedconfig(args.sharedconfig_path)
+    untagged_count = tag_run.get_untagged_count()
+    if untagged_count:
+        print(f"\nReached the limit of {args.max_seconds} seconds, {untagged_count} games " + \
+            "weren't tagged and will be checked on the next run.")
 
-    # This makes the code slightly cleaner
-    apps = get_apps_list(sharedconfig, args.fetch_games)
+    if args.export_changes_path:
+        export_changes(args.export_changes_path, change_sets)
 
-    cache_manager = CacheManager()
-    app_count = len(apps)
+    end_time = time.time() - start_time
 
-    print(f"\nFound a total of {app_count} Steam games.")
+    print(f"Took a total of {round(end_time, 2)} seconds to process, " + \
+        f"with an average of {round(end_time / max(app_count, 1), 2)} seconds per game")
+
+    # The sharedconfigs which were saved, or didn't need to be
+    saved_paths = []
+    with metrics_manager.phase("sharedconfig_save"):
+        for (sharedconfig_path, sharedconfig) in tag_run.get_sharedconfigs():
+            changes = change_sets[sharedconfig_path]
+
+            # True if -n or --no-save is passed, nothing to save if none of the tags changed
+            saved = False
+            if args.no_save:
+                if changes:
+                    print(f"\n{len(changes)} tags would have changed in {sharedconfig_path}, " + \
+                        "but saving is disabled.")
+            elif not changes:
+                if tag_run.get_apps_to_tag(sharedconfig_path):
+                    print(f"\nNone of the tags in {sharedconfig_path} have changed, " + \
+                        "so there is nothing to save.")
+                saved = True
+            elif args.watch:
+                sharedconfig_manager.write_sharedconfig(sharedconfig_path, sharedconfig)
+                saved = True
+            else:
+                saved = sharedconfig_manager.save_sharedconfig(sharedconfig_path, sharedconfig)
 
-    # Nothing found, just stop here since there is nothing to do.
-    if app_count == 0:
-        return
+            if saved:
+                saved_paths.append(sharedconfig_path)
 
-    start_time = time.time()
+    # Expired values used for the tags are recorded for the next run once the tags are saved
+    tag_run.finish(saved_paths)
+    restore_interrupt_handler(previous_handlers)
 
-    for count, app_id in enumerate(apps, 1):
-        # This has to be here because some Steam AppID's are strings of text,
-        # which ProtonDB does not support. Check test01.vdf line 278 for an example.
-        try:
-            int(app_id)
-        except ValueError:
-            continue
-
-        game_rating = ""
-        # If the app is native, no need to check ProtonDB
-        if args.check_native and is_native(app_id, args.skip_cache, cache_manager):
-            game_rating = "native"
-        else:
-            # Get the ProtonDB rating for the app, if nothing returned defaults to unrated
-            game_rating = get_protondb_rating(app_id, args.skip_cache, cache_manager)
-
-        tag_num = get_tag_number(apps[app_id])
-
-        # The numbers force the better ranks to be at the top, as Steam sorts these alphanumerically
-        possible_ranks = {
-            "native":   "ProtonDB Ranking: 0 Native",
-            "platinum": "ProtonDB Ranking: 1 Platinum",
-            "gold":     "ProtonDB Ranking: 2 Gold",
-            "silver":   "ProtonDB Ranking: 3 Silver",
-            "bronze":   "ProtonDB Ranking: 4 Bronze",
-            "pending":  "ProtonDB Ranking: 5 Pending",
-            "unrated":  "ProtonDB Ranking: 6 Unrated",
-            "borked":   "ProtonDB Ranking: 7 Borked",
-        }
-
-        new_rank = True
-
-        if "tags" not in apps[app_id]:
-            apps[app_id]["tags"] = {}
-
-        if tag_num in apps[app_id]["tags"]:
-            old_tag = apps[app_id]["tags"][tag_num]
-            old_key = ""
-
-            # Get the old key (protondb ranking)
-            for key, value in possible_ranks.items():
-                if value == old_tag:
-                    old_key = key
-                    break
-
-            # No change since last run, we don't need to output or save it
-            if old_key == game_rating:
-                new_rank = False
-            else:
-                print(f"{app_id} | {old_key} => {game_rating} ({count} of {app_count})")
-        else:
-            print(f"{app_id} | {game_rating} ({count} of {app_count})")
-
-        if new_rank:
-            # Try to inject the tag into the vdfDict, if the returned rating from ProtonDB isn't a
-            # key in possible_ranks it will error out
-            if game_rating in possible_ranks:
-                apps[app_id]["tags"][tag_num] = possible_ranks[game_rating]
-            else:
-                print(f"Unknown ProtonDB rating: {game_rating}\n Please report this on GitHub!")
+    if tag_engine.get_http_client():
+        tag_engine.get_http_client().log_stats()
+    write_metrics(args, metrics_manager, tag_engine)
 
-        if count > 0 and count % 10 == 0:
-            print(f"Processed ({count} of {app_count}) games...")
-            cache_manager.save_caches() # Save every once in awhile
+    if args.watch:
+        print(f"\nWatching {len(tag_run.get_sharedconfigs())} sharedconfig files for changes, " + \
+            "press Ctrl+C to stop.")
 
-    cache_manager.save_caches()
-    end_time = time.time() - start_time
+        try:
+            tag_engine.watch(tag_run.get_sharedconfigs(), args.watch_interval,
+                args.refresh_interval, not args.no_save)
+        except KeyboardInterrupt:
+            tag_engine.close()
+            print("\nStopped watching.")
 
-    print(f"Took a total of {round(end_time, 2)} seconds to process, " + \
-        f"with an average of {round(end_time / app_count, 2)} seconds per game")
 
-    # True if -n or --no-save is passed
-    if not args.no_save:
-        sharedconfig_manager.save_sharedconfig(sharedconfig_path, sharedconfig)
+def get_argument_parser() -> argparse.ArgumentParser:
+    '''Gets the parser for the command line options.'''
 
-# Run it
-if __name__ == "__main__":
-    PARSER = argparse.ArgumentParser(
+    parser = argparse.ArgumentParser(
         description = "Add Steam games to categories based on ProtonDB rankings"
     )
 
-    PARSER.add_argument(
+    parser.add_argument(
         "-c", "--check-native",
         dest = "check_native",
         action = "store_true",
         default = False,
-        help = "Check for native Linux support (will add 1.3 seconds per non-cached game)"
+        help = "Check for native Linux support (Steam allows 10 non-cached games per 10 seconds)"
     )
 
-    PARSER.add_argument(
+    parser.add_argument(
         "-n", "--no-save",
         dest = "no_save",
         action = "store_true",
@@ -363,7 +259,7 @@ if __name__ == "__main__":
         help = "Disable the save option at the end to allow for unattended testing"
     )
 
-    PARSER.add_argument(
+    parser.add_argument(
         "-f", "--fetch-games",
         dest = "fetch_games",
         action = "store_true",
@@ -371,7 +267,16 @@ if __name__ == "__main__":
         help = "Fetch your games list from the Steam API"
     )
 
-    PARSER.add_argument(
+    parser.add_argument(
+        "--owned-games-ttl",
+        dest = "owned_games_ttl",
+        type = float,
+        default = 24,
+        help = "Hours to keep the games list from --fetch-games before asking Steam again " + \
+            "(default: 24)"
+    )
+
+    parser.add_argument(
         "--clear-config",
         dest = "clear_config",
         action = "store_true",
@@ -379,7 +284,7 @@ if __name__ == "__main__":
         help = "Clear your current config, useful if the values in there need to be refreshed."
     )
 
-    PARSER.add_argument(
+    parser.add_argument(
         "--skip-cache",
         dest = "skip_cache",
         action = "store_true",
@@ -387,13 +292,196 @@ if __name__ == "__main__":
         help = "Skip reading your current cache, values retreived will still be added to the cache."
     )
 
-    PARSER.add_argument(
+    parser.add_argument(
+        "--stale-ok",
+        dest = "stale_ok",
+        action = "store_true",
+        default = False,
+        help = "Use expired cached values instead of waiting for them, " + \
+            "they will be refreshed in the background for the next run."
+    )
+
+    parser.add_argument(
+        "--ingest-reports",
+        dest = "ingest_reports",
+        default = None,
+        help = "Read a downloaded ProtonDB reports dump (JSON or NDJSON, optionally " + \
+            "compressed) and save the rating for each game, for use with --use-reports"
+    )
+
+    parser.add_argument(
+        "--export-cache",
+        dest = "export_cache",
+        default = None,
+        help = "Write the ProtonDB and Steam native caches to a compressed bundle, " + \
+            "which can be used with --import-cache on another PC"
+    )
+
+    parser.add_argument(
+        "--import-cache",
+        dest = "import_cache",
+        default = None,
+        help = "Add the entries from a bundle written by --export-cache to the caches, " + \
+            "keeping whichever entry expires later"
+    )
+
+    parser.add_argument(
+        "--order",
+        dest = "order",
+        choices = APP_ORDERS,
+        default = "recent",
+        help = "Which games to tag first: the most recently played, the ones with a cached " + \
+            "rating, or the order they are in the sharedconfig (default: recent)"
+    )
+
+    parser.add_argument(
+        "--max-seconds",
+        dest = "max_seconds",
+        type = float,
+        default = None,
+        help = "Stop fetching ratings after this many seconds, tagging the games which have " + \
+            "been fetched so far. The rest are checked on the next run."
+    )
+
+    parser.add_argument(
+        "--resume",
+        dest = "resume",
+        action = "store_true",
+        default = False,
+        help = "Carry on from where an interrupted run stopped, " + \
+            "without checking the games it already checked again"
+    )
+
+    parser.add_argument(
+        "--offline",
+        dest = "offline",
+        action = "store_true",
+        default = False,
+        help = "Don't make any requests, only tag games which have a cached rating " + \
+            "(even if it has expired) or are in the reports index with --use-reports"
+    )
+
+    parser.add_argument(
+        "--use-reports",
+        dest = "use_reports",
+        action = "store_true",
+        default = False,
+        help = "Use the ratings saved by --ingest-reports instead of ProtonDB's API where possible"
+    )
+
+    parser.add_argument(
+        "-i", "--incremental",
+        dest = "incremental",
+        action = "store_true",
+        default = False,
+        help = "Only check games which are new or whose rating has expired since the last run"
+    )
+
+    parser.add_argument(
+        "-w", "--workers",
+        dest = "workers",
+        type = int,
+        default = 1,
+        help = "Number of games to fetch ratings for at the same time (default: 1)"
+    )
+
+    parser.add_argument(
+        "--protondb-rate-limit",
+        dest = "protondb_rate_limit",
+        type = int,
+        default = None,
+        help = "Maximum number of requests per second to make to ProtonDB, 0 for no limit " + \
+            "(default: 10)"
+    )
+
+    parser.add_argument(
+        "-a", "--all-users",
+        dest = "all_users",
+        action = "store_true",
+        default = False,
+        help = "Tag the games for every Steam user on this PC, looking up each game only once"
+    )
+
+    parser.add_argument(
+        "--watch",
+        dest = "watch",
+        action = "store_true",
+        default = False,
+        help = "Keep running after tagging, and tag new games as they are added to your " + \
+            "library. Saves without asking, and without asking Steam to import the tags."
+    )
+
+    parser.add_argument(
+        "--watch-interval",
+        dest = "watch_interval",
+        type = float,
+        default = 5,
+        help = "How often to check sharedconfig.vdf for changes in seconds when using --watch " + \
+            "(default: 5)"
+    )
+
+    parser.add_argument(
+        "--refresh-budget",
+        dest = "refresh_budget",
+        type = int,
+        default = None,
+        help = "Before tagging, fetch the cached ratings which expire soonest again, " + \
+            "using up to this many requests"
+    )
+
+    parser.add_argument(
+        "--refresh-window",
+        dest = "refresh_window",
+        type = float,
+        default = None,
+        help = "Before tagging, fetch the cached ratings which expire within this many " + \
+            "hours again, can be used with --refresh-budget"
+    )
+
+    parser.add_argument(
+        "--refresh-interval",
+        dest = "refresh_interval",
+        type = float,
+        default = 3600,
+        help = "How often to update games whose ratings have expired in seconds when using " + \
+            "--watch (default: 3600)"
+    )
+
+    parser.add_argument(
+        "--metrics",
+        dest = "metrics_path",
+        default = None,
+        help = "Write timings, cache hit rates and request stats for the run to this JSON file"
+    )
+
+    parser.add_argument(
+        "--metrics-prometheus",
+        dest = "metrics_prometheus_path",
+        default = None,
+        help = "Write the same metrics as --metrics to this file, for the Prometheus node " + \
+            "exporter's textfile collector"
+    )
+
+    parser.add_argument(
+        "--export-changes",
+        dest = "export_changes_path",
+        default = None,
+        help = "Write the tags which were changed to this JSON file, use with --no-save " + \
+            "to see what would change without saving"
+    )
+
+    parser.add_argument(
         "-s", "--sharedconfig",
         dest = "sharedconfig_path",
         default = None,
         help = "Specify a custom location for sharedconfig.vdf"
     )
 
-    ARGUMENTS = PARSER.parse_args()
+    return parser
+
+
+# Run it
+if __name__ == "__main__":
+    ARGUMENTS = get_argument_parser().parse_args()
 
     main(ARGUMENTS)
@@ -0,0 +1,108 @@
+'''Check VDF Patcher'''
+
+import sys
+
+import vdf
+
+from Utils.VdfPatcher import parse_vdf, patch_vdf
+
+
+def find_apps(data: dict, layout) -> tuple:
+    '''Returns the apps dict and its block in the layout, or (None, None) if there isn't one.'''
+
+    stack = [(data, layout.root)]
+    while stack:
+        (parent, parent_block) = stack.pop()
+        for key, value in parent.items():
+            if isinstance(value, dict):
+                if key.lower() == "apps":
+                    return (value, parent_block.children[key])
+                stack.append((value, parent_block.children[key]))
+    return (None, None)
+
+
+def check_changes(text: str, untouched: int) -> list:
+    '''Changes the tags of every other app, leaving the apps at even positions untouched if
+       untouched is 0 or at odd positions if it is 1. Then checks the patched file matches the
+       changes and that the untouched apps and everything around the apps were kept as they were.\n
+       Returns a list of the checks which failed.'''
+
+    errors = []
+    (data, layout) = parse_vdf(text)
+    (apps, apps_block) = find_apps(data, layout)
+    if not apps:
+        return ["no apps found"]
+
+    # Add, change and remove a tag for the other apps, the same as tagging does
+    untouched_apps = {}
+    for (count, (app_id, app)) in enumerate(apps.items()):
+        if count % 2 == untouched:
+            app_block = apps_block.children[app_id]
+            untouched_apps[app_id] = text[app_block.start:app_block.end]
+            continue
+
+        if not isinstance(app.get("tags"), dict):
+            app["tags"] = {}
+        if count % 4 < 2 and app["tags"]:
+            del app["tags"][list(app["tags"])[0]]
+        app["tags"][str(len(app["tags"]) + 10)] = "ProtonDB Ranking: 2 Gold"
+    apps["1234567"] = {"tags": {"0": "ProtonDB Ranking: 1 Platinum"}}
+
+    patched = patch_vdf(layout, data)
+    if vdf.loads(patched) != data:
+        errors.append("patched file doesn't match the changes")
+
+    # Everything before the first app and after the last app must be kept as it was
+    first_app_start = min(child.start for child in apps_block.children.values())
+    if patched[:first_app_start] != text[:first_app_start]:
+        errors.append("start of file was changed")
+    if not patched.endswith(text[apps_block.close_start:]):
+        errors.append("end of file was changed")
+
+    # As must the apps which weren't changed, byte for byte
+    (_, patched_layout) = parse_vdf(patched)
+    (_, patched_apps_block) = find_apps(data, patched_layout)
+    for (app_id, app_text) in untouched_apps.items():
+        app_block = patched_apps_block.children[app_id]
+        if patched[app_block.start:app_block.end] != app_text:
+            errors.append(f"unchanged app {app_id} was changed")
+
+    return errors
+
+
+def check_file(vdf_path: str) -> list:
+    '''Checks that patching the file gives the same results as vdf.dump,
+       and that anything which wasn't changed is left as it was.\n
+       Returns a list of the checks which failed.'''
+
+    with open(vdf_path, encoding="utf-8", newline="") as vdf_file:
+        text = vdf_file.read()
+
+    errors = []
+    (data, layout) = parse_vdf(text)
+    if data != vdf.loads(text):
+        errors.append("parsed differently to vdf.loads")
+    if patch_vdf(layout, data) != text:
+        errors.append("unchanged file was not kept as it was")
+
+    # Each app is changed by one of the checks and left untouched by the other
+    for untouched in (0, 1):
+        errors += [error for error in check_changes(text, untouched) if error not in errors]
+
+    return errors
+
+
+def main(paths: list) -> int:
+    '''Checks each of the files, and returns 1 if any of them failed.'''
+
+    failed = False
+    for path in paths:
+        errors = check_file(path)
+        print(f"{path}: " + ("OK" if not errors else "FAILED - " + ", ".join(errors)))
+        failed = failed or bool(errors)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    # Usage: python -m Tests.CheckVdfPatcher test-sharedconfigs/*.vdf
+    sys.exit(main(sys.argv[1:]))
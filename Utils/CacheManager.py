@@ -1,11 +1,27 @@
 '''Cache Manager'''
 
+import gzip
 import json
+import logging
 import os
 import random
+import sqlite3
+import threading
 import time
 
-class CacheManager:
+from Utils.CompactIndex import TIERS, CompactIndex, can_index, write_compact_index
+
+_logger = logging.getLogger(__name__)
+
+# Identifies a file written by CacheManager.export_caches, and the version of its layout
+BUNDLE_FORMAT = "ProtonDB-Tags cache bundle"
+BUNDLE_VERSION = 1
+BUNDLE_TABLES = ("steam_native", "protondb")
+
+# The values each cache can have in its snapshot, see CacheManager.save_index
+SNAPSHOT_VALUES = {"steam_native": [False, True], "protondb": TIERS}
+
+class CacheManager: # pylint: disable=too-many-instance-attributes,too-many-public-methods
     '''Cache Manager'''
 
     # Need to figure out when this will be safe to remove
@@ -15,14 +31,14 @@ class CacheManager:
            this should migrate our old cache to the correct location.'''
 
         if os.path.exists(os.path.join(cache_path, ".cache/ProtonDB-Tags")):
-            print("Old cache path detected, moving cache to new location...")
+            _logger.info("Old cache path detected, moving cache to new location...")
 
             old_cache_path = os.path.join(cache_path, ".cache/ProtonDB-Tags")
             new_cache_path = os.path.join(cache_path, "ProtonDB-Tags")
             os.rename(old_cache_path, new_cache_path)
 
             if len(os.listdir(os.path.join(cache_path, ".cache"))) == 0:
-                print(f"Old cache path '{old_cache_path}' is now empty, removing it...")
+                _logger.info("Old cache path '%s' is now empty, removing it...", old_cache_path)
                 os.rmdir(os.path.join(cache_path, ".cache"))
 
 
@@ -43,61 +59,357 @@ class CacheManager:
         return cache_path
 
 
-    def __init__(self):
-        '''Init, loads or creates the cache if not found.'''
+    def _migrate_json_cache(self, table: str, json_path: str, name: str) -> None:
+        '''private: The caches used to be stored as JSON files,
+           this copies them into the database the first time it is used.'''
+
+        if not os.path.exists(json_path):
+            return
+
+        _logger.info("Old %s cache detected, moving it into the database...", name)
+
+        try:
+            with open(json_path, encoding="utf-8") as cache_json:
+                json_cache = json.load(cache_json)
+        except json.JSONDecodeError:
+            _logger.warning("Error reading %s cache, creating a new one...", name)
+            json_cache = {}
+
+        with self._connection:
+            self._connection.executemany(
+                f"INSERT OR IGNORE INTO {table} (app_id, time_to_check, entry) VALUES (?, ?, ?)",
+                [
+                    (app_id, int(app_cache["time_to_check"]), json.dumps(app_cache))
+                    for app_id, app_cache in json_cache.items()
+                    if "time_to_check" in app_cache and "value" in app_cache
+                ]
+            )
+
+            self._increment_generation()
+
+        os.rename(json_path, json_path + ".migrated")
+
+
+    def __init__(self, stale_ok: bool = False, refresh_stale: bool = True):
+        '''Init, opens or creates the cache database if not found.\n
+           If stale_ok is set expired values will be returned as if they were still valid.
+           If refresh_stale is set the values which were returned expired by the last run aren't
+           returned expired again, so that they are fetched this time.'''
 
         self._base_cache_path = self._get_cache_path()
-        self._steam_native_cache_path = os.path.join(self._base_cache_path, "steamNativeCache.json")
-        self._protondb_cache_path = os.path.join(self._base_cache_path, "protonDBCache.json")
-        self._steam_native_cache = {}
-        self._protondb_cache = {}
-
-        if os.path.exists(self._steam_native_cache_path):
-            try:
-                with open(self._steam_native_cache_path, encoding="utf-8") as cache_json:
-                    self._steam_native_cache = json.load(cache_json)
-            except json.JSONDecodeError:
-                print("Error reading Steam native cache, creating a new one...")
-                self._steam_native_cache = {}
-        else:
-            print("\nSteam native cache not found.")
-            print(f"This will be created here: {self._steam_native_cache_path}")
-
-        if os.path.exists(self._protondb_cache_path):
-            try:
-                with open(self._protondb_cache_path, encoding="utf-8") as cache_json:
-                    self._protondb_cache = json.load(cache_json)
-            except json.JSONDecodeError:
-                print("Error reading ProtonDB cache, creating a new one...")
-                self._protondb_cache = {}
-        else:
-            print("\nProtonDB cache not found.")
-            print(f"This will be created here: {self._protondb_cache_path}")
-
-
-    def get_from_steam_native_cache(self, app_id: str) -> tuple: # [bool, bool]
-        '''Gets a value from the Steam native cache.\n
-           If the cached value has expired returns as if it did not exist.'''
+        database_path = os.path.join(self._base_cache_path, "cache.sqlite3")
+
+        self._stale_ok = stale_ok
+
+        # The apps which expired values were returned for, keyed by table name, and the ones
+        # from the last run which are due to be fetched again
+        self._stale_apps = {table: set() for table in BUNDLE_TABLES}
+        self._stale_apps_path = os.path.join(self._base_cache_path, "staleApps.json")
+        self._refresh_due = self._read_stale_apps()
+        self._refresh_stale = refresh_stale
+
+        # Entries which have been added since the last save, keyed by table name.
+        # The owned games are keyed by Steam ID instead of app ID.
+        self._pending = {"steam_native": {}, "protondb": {}, "owned_games": {}}
+
+        # How many lookups in each cache were hits, misses, or returned expired values
+        self._stats = {table: {"hits": 0, "misses": 0, "stale": 0} for table in self._pending}
+        self._stats.update({"saves": 0, "save_seconds": 0.0})
+
+        # The caches may be read and written from multiple worker threads at once
+        self._lock = threading.RLock()
+
+        if not os.path.exists(database_path):
+            _logger.info("\nCache not found.")
+            _logger.info("This will be created here: %s", database_path)
+
+        self._connection = sqlite3.connect(database_path, check_same_thread=False)
+
+        with self._connection:
+            for table in self._pending:
+                self._connection.execute(
+                    f"CREATE TABLE IF NOT EXISTS {table} (" + \
+                    "app_id TEXT PRIMARY KEY, time_to_check INTEGER NOT NULL, entry TEXT NOT NULL)"
+                )
+
+                # Used to find the entries which expire soonest without reading all of them
+                self._connection.execute(
+                    f"CREATE INDEX IF NOT EXISTS {table}_time_to_check ON {table} (time_to_check)"
+                )
+
+        self._migrate_json_cache("steam_native",
+            os.path.join(self._base_cache_path, "steamNativeCache.json"), "Steam native")
+        self._migrate_json_cache("protondb",
+            os.path.join(self._base_cache_path, "protonDBCache.json"), "ProtonDB")
+
+        # Read only snapshots of the caches for fast lookups, and the apps which have been saved
+        # since they were written so are out of date in them
+        self._snapshots = {table: self._open_snapshot(table) for table in SNAPSHOT_VALUES}
+        self._saved = {table: set() for table in self._pending}
+
+
+    def _get_generation(self) -> int:
+        '''private: Gets the generation of the database, which goes up each time it is changed.'''
+
+        return self._connection.execute("PRAGMA user_version").fetchone()[0]
+
+
+    def _increment_generation(self) -> None:
+        '''private: Records that the database has changed, so the snapshots are out of date.'''
+
+        self._connection.execute(f"PRAGMA user_version = {self._get_generation() + 1}")
+
+
+    def _get_snapshot_path(self, table: str) -> str:
+        '''private: Gets the path of the snapshot for a cache.'''
+
+        return os.path.join(self._base_cache_path, f"cache.{table}.idx")
+
+
+    def _open_snapshot(self, table: str) -> CompactIndex:
+        '''private: Opens the snapshot for a cache, or None if there isn't one
+           for the current generation of the database.'''
+
+        snapshot_path = self._get_snapshot_path(table)
+        if not os.path.exists(snapshot_path):
+            return None
+
+        try:
+            snapshot = CompactIndex(snapshot_path, SNAPSHOT_VALUES[table])
+        except ValueError:
+            return None
+
+        if snapshot.get_generation() != self._get_generation():
+            snapshot.close()
+            return None
+
+        return snapshot
+
+
+    def _read_stale_apps(self) -> dict:
+        '''private: Reads the apps which expired values were returned for on the last run,
+           keyed by table name.'''
+
+        stale_apps = {table: set() for table in BUNDLE_TABLES}
+
+        try:
+            with open(self._stale_apps_path, encoding="utf-8") as stale_apps_json:
+                for table, app_ids in json.load(stale_apps_json).items():
+                    if table in stale_apps:
+                        stale_apps[table].update(app_ids)
+        except FileNotFoundError:
+            pass
+        except (json.JSONDecodeError, AttributeError, TypeError):
+            _logger.warning("Error reading the expired cache entries, they won't be refreshed...")
+
+        return stale_apps
+
+
+    def save_stale_apps(self) -> None:
+        '''Saves the apps which expired values were returned for, so the next run fetches them
+           again instead of using the expired values. Along with the ones from the last run
+           which haven't been fetched yet.'''
+
+        with self._lock:
+            stale_apps = {table: sorted(self._refresh_due[table] | self._stale_apps[table])
+                for table in BUNDLE_TABLES}
+
+        if not any(stale_apps.values()):
+            if os.path.exists(self._stale_apps_path):
+                os.remove(self._stale_apps_path)
+            return
+
+        temp_path = self._stale_apps_path + ".tmp"
+        with open(temp_path, mode="w", encoding="utf-8") as stale_apps_json:
+            json.dump(stale_apps, stale_apps_json)
+
+        os.replace(temp_path, self._stale_apps_path)
+
+
+    def get_base_cache_path(self) -> str:
+        '''Gets the folder the caches are stored in.'''
+
+        return self._base_cache_path
+
+
+    def _get_entry(self, table: str, app_id: str) -> dict:
+        '''private: Gets the cache entry for an app, or None if it is not in the cache.'''
+
+        with self._lock:
+            if app_id in self._pending[table]:
+                return self._pending[table][app_id]
+
+            row = self._connection.execute(
+                f"SELECT entry FROM {table} WHERE app_id = ?", (app_id,)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        return json.loads(row[0])
+
+
+    def _get_snapshot_entry(self, table: str, app_id: str) -> dict:
+        '''private: Gets the time to check and value for an app from the snapshot, or None if it
+           isn't there or has changed since the snapshot was written.'''
+
+        with self._lock:
+            snapshot = self._snapshots.get(table)
+            if snapshot is None or app_id in self._pending[table] or app_id in self._saved[table]:
+                return None
+
+            snapshot_entry = snapshot.get_entry(app_id)
+
+        if snapshot_entry is None or snapshot_entry[0] is None:
+            return None
+
+        return {"time_to_check": snapshot_entry[1], "value": snapshot_entry[0]}
+
+
+    def _set_entry(self, table: str, app_id: str, app_cache: dict) -> None:
+        '''private: Sets the cache entry for an app, this is written on the next save.'''
+
+        with self._lock:
+            self._pending[table][app_id] = app_cache
+
+            # Fetched again, so it doesn't need refreshing on the next run
+            if table in self._refresh_due:
+                self._refresh_due[table].discard(app_id)
+
+
+    def _get_value(self, table: str, app_id: str, allow_stale: bool = True,
+        count_miss: bool = True) -> tuple: # [bool, any]
+        '''private: Gets a value from the cache, counting if it was a hit, miss or stale.\n
+           If the cached value has expired returns as if it did not exist,
+           unless stale_ok and allow_stale are set. Misses are only counted if count_miss is
+           set.'''
 
         found_in_cache = False
         value = False
+        result = "misses"
+
+        app_cache = self._get_snapshot_entry(table, app_id) or self._get_entry(table, app_id)
 
-        if app_id in self._steam_native_cache:
-            app_cache = self._steam_native_cache[app_id]
+        if app_cache is not None:
             if "time_to_check" in app_cache and "value" in app_cache:
                 if int(app_cache["time_to_check"]) > int(time.time()):
                     value = app_cache["value"]
                     found_in_cache = True
+                    result = "hits"
+                elif self._stale_ok and allow_stale and not (self._refresh_stale \
+                    and app_id in self._refresh_due.get(table, ())):
+                    value = app_cache["value"]
+                    found_in_cache = True
+                    result = "stale"
+
+                    with self._lock:
+                        self._stale_apps[table].add(app_id)
+
+        if result != "misses" or count_miss:
+            with self._lock:
+                self._stats[table][result] += 1
 
         return (found_in_cache, value)
 
 
+    def get_stats(self) -> dict:
+        '''Gets how many lookups in each cache were hits, misses, or returned expired values,
+           along with how many times the caches were saved and how long that took.'''
+
+        with self._lock:
+            return {key: dict(value) if isinstance(value, dict) else value
+                for key, value in self._stats.items()}
+
+
+    def set_stale_ok(self, stale_ok: bool) -> None:
+        '''Sets if expired values should be returned as if they were still valid.'''
+
+        self._stale_ok = stale_ok
+
+
+    def is_stale(self, app_id: str) -> bool:
+        '''Checks if an expired value has been returned for the app from either cache.'''
+
+        with self._lock:
+            return any(app_id in stale_apps for stale_apps in self._stale_apps.values())
+
+
+    def get_stale_apps(self) -> set:
+        '''Gets the app IDs which have had an expired value returned from either cache.'''
+
+        with self._lock:
+            return set().union(*self._stale_apps.values())
+
+
+    def get_time_to_check(self, app_id: str, check_native: bool) -> int:
+        '''Gets when the cached values for the app will expire,
+           or None if it is not in either cache.'''
+
+        tables = ["steam_native", "protondb"] if check_native else ["protondb"]
+        times_to_check = []
+
+        for table in tables:
+            app_cache = self._get_snapshot_entry(table, app_id) or self._get_entry(table, app_id)
+            if app_cache is not None and "time_to_check" in app_cache:
+                times_to_check.append(int(app_cache["time_to_check"]))
+
+        return min(times_to_check) if times_to_check else None
+
+
+    def get_expiring_entries(self, limit: int = None, expires_before: int = None,
+        check_native: bool = False) -> list:
+        '''Gets the cached values which expire soonest, soonest first, as a list of
+           (time to check, cache name, app ID). The cache name is "protondb" or "steam_native".\n
+           At most limit entries are returned, and only those which expire before expires_before
+           if it is set. Steam native entries are only included if check_native is set.'''
+
+        tables = ["steam_native", "protondb"] if check_native else ["protondb"]
+        entries = []
+
+        with self._lock:
+            for table in tables:
+                pending = self._pending[table]
+
+                query = f"SELECT app_id, time_to_check FROM {table}"
+                parameters = []
+                if expires_before is not None:
+                    query += " WHERE time_to_check < ?"
+                    parameters.append(expires_before)
+                query += " ORDER BY time_to_check"
+                if limit is not None:
+                    # Entries which have changed since the last save are skipped, so get extra
+                    query += " LIMIT ?"
+                    parameters.append(limit + len(pending))
+
+                for (app_id, time_to_check) in self._connection.execute(query, parameters):
+                    if app_id not in pending:
+                        entries.append((time_to_check, table, app_id))
+
+                for app_id, app_cache in pending.items():
+                    time_to_check = int(app_cache["time_to_check"])
+                    if expires_before is None or time_to_check < expires_before:
+                        entries.append((time_to_check, table, app_id))
+
+        entries.sort()
+        return entries if limit is None else entries[:limit]
+
+
+    def get_from_steam_native_cache(self, app_id: str, count_miss: bool = True) \
+        -> tuple: # [bool, bool]
+        '''Gets a value from the Steam native cache.\n
+           If the cached value has expired returns as if it did not exist,
+           unless stale_ok is set. count_miss can be turned off if the app will be looked up
+           again when it isn't found, so the miss is only counted once.'''
+
+        return self._get_value("steam_native", app_id, count_miss=count_miss)
+
+
     def add_to_steam_native_cache(self, app_id: str, value: bool, days:int = 7, offset:int = 7) \
         -> None:
         '''Adds the specified value to the Steam native cache,
            sets expiration to (7 days + random value 0-7 days).'''
 
-        self._steam_native_cache[app_id] = app_cache = {}
+        app_cache = {}
 
         # 86400 = seconds in 1 day
         # 604800 = seconds in 7 days
@@ -106,29 +418,113 @@ class CacheManager:
 
         app_cache["value"] = value
 
+        self._set_entry("steam_native", app_id, app_cache)
 
-    def get_from_protondb_cache(self, app_id: str) -> tuple: # [bool, str]
-        '''Gets a value from the ProtonDB cache.\n
-           If the cached value has expired returns as if it did not exist.'''
 
-        found_in_cache = False
-        value = False
+    def _add_failure(self, table: str, app_id: str, value, backoff: tuple,
+        keep_value: bool = True) -> tuple:
+        '''private: Records a failed lookup for an app, so it isn't looked up again for a while.\n
+           backoff is (first wait, longest wait) in seconds, the wait doubles with each failure in a
+           row. If keep_value is set any value already cached is kept, otherwise value is used.
+           Returns the value and if it was already cached.'''
 
-        if app_id in self._protondb_cache:
-            app_cache = self._protondb_cache[app_id]
-            if "time_to_check" in app_cache and "value" in app_cache:
-                if int(app_cache["time_to_check"]) > int(time.time()):
-                    value = app_cache["value"]
-                    found_in_cache = True
+        (first_wait, longest_wait) = backoff
 
-        return (found_in_cache, value)
+        with self._lock:
+            app_cache = dict(self._get_entry(table, app_id) or {})
+            found_in_cache = keep_value and "value" in app_cache
+
+            failures = int(app_cache.get("failures", 0)) + 1
+            wait = min(first_wait * (2 ** min(failures - 1, 16)), longest_wait)
+
+            # Up to 10% extra, so the retries don't all happen at the same time
+            app_cache["time_to_check"] = int(time.time() + wait + random.randint(0, int(wait / 10)))
+            app_cache["failures"] = failures
+            if not found_in_cache:
+                app_cache["value"] = value
+
+            self._set_entry(table, app_id, app_cache)
+
+        return (app_cache["value"], found_in_cache)
+
+
+    def _get_last_value(self, table: str, app_id: str, default) -> tuple: # [any, bool]
+        '''private: Gets the cached value for an app even if it has expired, without counting it
+           as a hit or miss. Returns the value, or default if there isn't one, and if it was
+           cached.'''
+
+        app_cache = self._get_snapshot_entry(table, app_id) or self._get_entry(table, app_id)
+        if app_cache is None or "value" not in app_cache:
+            return (default, False)
+
+        return (app_cache["value"], True)
+
+
+    def get_last_steam_native_value(self, app_id: str) -> bool:
+        '''Gets the last known value from the Steam native cache, even if it has expired,
+           for when Steam can't be asked right now. Returns False if there isn't one.'''
+
+        (value, _) = self._get_last_value("steam_native", app_id, False)
+        return value
+
+
+    def get_last_protondb_value(self, app_id: str) -> str:
+        '''Gets the last known value from the ProtonDB cache, even if it has expired,
+           for when ProtonDB can't be asked right now. Returns "unrated" if there isn't one.'''
 
+        (value, found_in_cache) = self._get_last_value("protondb", app_id, "unrated")
+        if found_in_cache and self._stale_ok:
+            with self._lock:
+                self._stale_apps["protondb"].add(app_id)
 
-    def add_to_protondb_cache(self, app_id: str, value: str, days:int = 7, offset:int = 7) -> None:
+        return value
+
+
+    def add_failure_to_steam_native_cache(self, app_id: str) -> bool:
+        '''Records that Steam couldn't be asked about the app, waiting 1 hour before asking again,
+           doubling each time it fails in a row up to 1 day.\n
+           Returns the last known value, or False if there isn't one.'''
+
+        (value, _) = self._add_failure("steam_native", app_id, False, (3600, 86400))
+        return value
+
+
+    def add_failure_to_protondb_cache(self, app_id: str, not_found: bool = False) -> str:
+        '''Records that ProtonDB couldn't be asked about the app, waiting 1 hour before asking
+           again, doubling each time it fails in a row up to 1 day.\n
+           If not_found is set ProtonDB doesn't have the game, this waits 1 day, doubling up to
+           14 days, and the game is unrated.
+           Returns the last known value, or "unrated" if there isn't one.'''
+
+        if not_found:
+            self._add_failure("protondb", app_id, "unrated", (86400, 86400 * 14), keep_value=False)
+            return "unrated"
+
+        # The last value is used for now, and fetched again next run if stale values are wanted
+        (value, found_in_cache) = self._add_failure("protondb", app_id, "unrated", (3600, 86400))
+        if found_in_cache and self._stale_ok:
+            with self._lock:
+                self._stale_apps["protondb"].add(app_id)
+
+        return value
+
+
+    def get_from_protondb_cache(self, app_id: str) -> tuple: # [bool, str]
+        '''Gets a value from the ProtonDB cache.\n
+           If the cached value has expired returns as if it did not exist,
+           unless stale_ok is set.'''
+
+        return self._get_value("protondb", app_id)
+
+
+    def add_to_protondb_cache(self, app_id: str, value: str, days:int = 7, offset:int = 7,
+        validators: dict = None) -> None:
         '''Adds the specified value to the ProtonDB cache,
-           sets expiration to (7 days + random value 0-7 days).'''
+           sets expiration to (7 days + random value 0-7 days).\n
+           validators can contain the "etag" and "last_modified" of the response,
+           which are used to check if the value has changed once it expires.'''
 
-        self._protondb_cache[app_id] = app_cache = {}
+        app_cache = {}
 
         # 86400 = seconds in 1 day
         # 604800 = seconds in 7 days
@@ -137,12 +533,184 @@ class CacheManager:
 
         app_cache["value"] = value
 
+        if validators:
+            app_cache.update(validators)
+
+        self._set_entry("protondb", app_id, app_cache)
+
+
+    def get_protondb_validators(self, app_id: str) -> dict:
+        '''Gets the "etag" and "last_modified" stored for an app in the ProtonDB cache,
+           even if the cached value has expired. Empty if there are none.'''
+
+        app_cache = self._get_entry("protondb", app_id)
+        if app_cache is None or "value" not in app_cache:
+            return {}
+
+        return {key: app_cache[key] for key in ("etag", "last_modified") if key in app_cache}
+
+
+    def extend_protondb_cache(self, app_id: str, days:int = 7, offset:int = 7) -> str:
+        '''Keeps the current value in the ProtonDB cache after ProtonDB says it hasn't changed,
+           sets expiration to (7 days + random value 0-7 days). Returns the cached value.'''
+
+        app_cache = dict(self._get_entry("protondb", app_id))
+
+        # The value is confirmed, so any earlier failures shouldn't add to the next backoff
+        app_cache.pop("failures", None)
+
+        # 86400 = seconds in 1 day
+        # 604800 = seconds in 7 days
+        app_cache["time_to_check"] = int(time.time()) + (86400 * days) \
+            + random.randint(0, (86400 * offset))
+
+        self._set_entry("protondb", app_id, app_cache)
+
+        return app_cache["value"]
+
+
+    def get_from_owned_games_cache(self, steam_id: str) -> tuple: # [bool, list]
+        '''Gets the app IDs of the games owned by the Steam user from the cache.\n
+           If the cached list has expired returns as if it did not exist,
+           even if stale_ok is set.'''
+
+        return self._get_value("owned_games", steam_id, allow_stale=False)
+
+
+    def add_to_owned_games_cache(self, steam_id: str, app_ids: list, hours: float = 24) -> None:
+        '''Adds the app IDs of the games owned by the Steam user to the cache,
+           sets expiration to 24 hours by default, so new purchases are picked up the next day.'''
+
+        app_cache = {}
+
+        # 3600 = seconds in 1 hour
+        app_cache["time_to_check"] = int(time.time() + (3600 * hours))
+        app_cache["value"] = list(app_ids)
+
+        self._set_entry("owned_games", steam_id, app_cache)
+
 
     def save_caches(self):
-        '''Writes the currently cached data to the disk.'''
+        '''Writes the entries added since the last save to the disk.'''
+
+        save_start = time.perf_counter()
+
+        with self._lock:
+            with self._connection:
+                for table, pending in self._pending.items():
+                    self._connection.executemany(
+                        f"INSERT OR REPLACE INTO {table} (app_id, time_to_check, entry) " + \
+                        "VALUES (?, ?, ?)",
+                        [
+                            (app_id, app_cache["time_to_check"], json.dumps(app_cache))
+                            for app_id, app_cache in pending.items()
+                        ]
+                    )
+
+                    if pending:
+                        self._saved[table].update(pending)
+                        self._increment_generation()
+                        pending.clear()
+
+            self._stats["saves"] += 1
+            self._stats["save_seconds"] += time.perf_counter() - save_start
+
+
+    def save_index(self) -> None:
+        '''Saves the caches, and writes a compact snapshot of each one if they have changed since
+           the last snapshot. The snapshots are memory mapped the next time the caches are opened,
+           so looking up values doesn't need to read the database.'''
+
+        self.save_caches()
+
+        with self._lock:
+            generation = self._get_generation()
+
+            for table, value_names in SNAPSHOT_VALUES.items():
+                snapshot = self._snapshots[table]
+                if snapshot is not None and snapshot.get_generation() == generation:
+                    continue
+
+                values = {}
+                expiries = {}
+                for (app_id, time_to_check, entry) in self._connection.execute(
+                    f"SELECT app_id, time_to_check, entry FROM {table}"):
+                    if can_index(app_id):
+                        values[app_id] = json.loads(entry).get("value")
+                        expiries[app_id] = time_to_check
+
+                if snapshot is not None:
+                    snapshot.close()
+
+                snapshot_path = self._get_snapshot_path(table)
+                write_compact_index(snapshot_path, values, value_names, expiries, generation)
+                self._snapshots[table] = CompactIndex(snapshot_path, value_names)
+                self._saved[table].clear()
+
+
+    def export_caches(self, bundle_path: str) -> int:
+        '''Writes both caches to a compressed bundle, which can be read by import_caches.\n
+           Returns the number of entries written.'''
+
+        self.save_caches()
+
+        # Only the ratings are shared, the owned games cache has Steam IDs in it
+        caches = {}
+        with self._lock:
+            for table in BUNDLE_TABLES:
+                caches[table] = {
+                    app_id: json.loads(entry) for (app_id, entry)
+                    in self._connection.execute(f"SELECT app_id, entry FROM {table}")
+                }
+
+        temp_path = bundle_path + ".tmp"
+        with gzip.open(temp_path, mode="wt", encoding="utf-8") as bundle_file:
+            json.dump({
+                "format": BUNDLE_FORMAT,
+                "version": BUNDLE_VERSION,
+                "exported": int(time.time()),
+                "caches": caches,
+            }, bundle_file)
+
+        os.replace(temp_path, bundle_path)
+
+        return sum(len(entries) for entries in caches.values())
+
+
+    def import_caches(self, bundle_path: str) -> int:
+        '''Merges the entries from a bundle written by export_caches into the caches.
+           When an app is in both, the entry which expires later is kept.\n
+           Returns the number of entries added or updated.
+           Raises ValueError if the file is not a bundle this version can read.'''
+
+        try:
+            with gzip.open(bundle_path, mode="rt", encoding="utf-8") as bundle_file:
+                bundle = json.load(bundle_file)
+        except (OSError, json.JSONDecodeError) as e:
+            raise ValueError(f"Invalid cache bundle: '{bundle_path}'") from e
+
+        if not isinstance(bundle, dict) or bundle.get("format") != BUNDLE_FORMAT:
+            raise ValueError(f"Invalid cache bundle: '{bundle_path}'")
+        if bundle.get("version") != BUNDLE_VERSION:
+            raise ValueError(f"Unsupported cache bundle version {bundle.get('version')}, " + \
+                f"only version {BUNDLE_VERSION} is supported.")
+
+        imported = 0
+        self.save_caches()
+
+        with self._lock:
+            for table in BUNDLE_TABLES:
+                times_to_check = dict(self._connection.execute(
+                    f"SELECT app_id, time_to_check FROM {table}"))
+
+                for app_id, app_cache in bundle["caches"].get(table, {}).items():
+                    if "time_to_check" not in app_cache or "value" not in app_cache:
+                        continue
+
+                    if int(app_cache["time_to_check"]) > times_to_check.get(app_id, 0):
+                        self._set_entry(table, app_id, app_cache)
+                        imported += 1
 
-        with open(self._steam_native_cache_path, mode='w', encoding="utf-8") as cache_file:
-            json.dump(self._steam_native_cache, cache_file)
+        self.save_caches()
 
-        with open(self._protondb_cache_path, mode='w', encoding="utf-8") as cache_file:
-            json.dump(self._protondb_cache, cache_file)
+        return imported
@@ -0,0 +1,114 @@
+'''Checkpoint Manager'''
+
+import json
+import logging
+import os
+import threading
+import time
+
+_logger = logging.getLogger(__name__)
+
+# Seconds between writes of the checkpoint while ratings are being added
+SAVE_INTERVAL = 10
+
+
+class CheckpointManager:
+    '''Checkpoint Manager, records the ratings and tag changes worked out during a run,
+       so a run which is interrupted can carry on where it stopped with --resume.'''
+
+    def __init__(self, cache_path: str, sharedconfig_paths: list, options: dict,
+        resume: bool = False):
+        '''Init, if resume is set loads the checkpoint left by an interrupted run.\n
+           The checkpoint is only used if it was for the same sharedconfigs and options.'''
+
+        self._checkpoint_path = os.path.join(cache_path, "checkpoint.json")
+        self._run = {
+            "sharedconfigs": sorted(os.path.realpath(path) for path in sharedconfig_paths),
+            "options": options,
+        }
+        self._ratings = {}
+        self._changes = {}
+        self._last_save = time.monotonic()
+
+        # Ratings are added from the worker threads
+        self._lock = threading.RLock()
+
+        if not os.path.exists(self._checkpoint_path):
+            if resume:
+                _logger.info("\nNo interrupted run was found, so there is nothing to resume.")
+            return
+
+        if not resume:
+            _logger.info("\nFound a checkpoint from an interrupted run, it will be replaced. " \
+                "Use --resume to carry on from it instead.")
+            return
+
+        try:
+            with open(self._checkpoint_path, encoding="utf-8") as checkpoint_json:
+                checkpoint = json.load(checkpoint_json)
+        except json.JSONDecodeError:
+            _logger.warning("Error reading the checkpoint, starting from the beginning...")
+            return
+
+        if checkpoint.get("run") != self._run:
+            _logger.info("\nThe interrupted run was for different sharedconfigs or options, " \
+                "starting from the beginning...")
+            return
+
+        self._ratings = checkpoint.get("ratings", {})
+        self._changes = checkpoint.get("changes", {})
+
+        change_count = sum(len(changes) for changes in self._changes.values())
+        _logger.info("\nResuming the interrupted run, %d games have already been checked and %d " \
+            "tags were waiting to be saved.", len(self._ratings), change_count)
+
+
+    def get_ratings(self) -> dict:
+        '''Gets the ratings from the interrupted run, as a dict of app ID to rating.'''
+
+        with self._lock:
+            return dict(self._ratings)
+
+
+    def set_rating(self, app_id: str, rating: str) -> str:
+        '''Records the rating for a game, the checkpoint is written every SAVE_INTERVAL seconds.\n
+           Returns the rating.'''
+
+        with self._lock:
+            self._ratings[app_id] = rating
+
+            if time.monotonic() - self._last_save >= SAVE_INTERVAL:
+                self.save_checkpoint()
+
+        return rating
+
+
+    def set_changes(self, sharedconfig_path: str, changes: list) -> None:
+        '''Records the tag changes from plan_tags for the sharedconfig,
+           and writes the checkpoint.'''
+
+        with self._lock:
+            self._changes[os.path.realpath(sharedconfig_path)] = \
+                [list(change) for change in changes]
+            self.save_checkpoint()
+
+
+    def save_checkpoint(self) -> None:
+        '''Writes the checkpoint to the disk.'''
+
+        with self._lock:
+            temp_path = self._checkpoint_path + ".tmp"
+            with open(temp_path, mode="w", encoding="utf-8") as checkpoint_file:
+                json.dump({"run": self._run, "ratings": self._ratings, "changes": self._changes},
+                    checkpoint_file)
+
+            os.replace(temp_path, self._checkpoint_path)
+            self._last_save = time.monotonic()
+
+
+    def remove_checkpoint(self) -> None:
+        '''Removes the checkpoint once the run has finished, as there is nothing to resume.'''
+
+        with self._lock:
+            if os.path.exists(self._checkpoint_path):
+                os.remove(self._checkpoint_path)
@@ -0,0 +1,83 @@
+'''Circuit Breaker'''
+
+import logging
+import threading
+import time
+
+import requests
+
+_logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(requests.ConnectionError):
+    '''Raised instead of making a request to a host which is currently failing.'''
+
+
+class CircuitBreaker:
+    '''Stops requests to a single host after it fails several times in a row,
+       so that each request doesn't have to wait for a timeout while the host is down.\n
+       Once reset_timeout seconds have passed a single request is let through to check
+       if the host is back, if it succeeds requests are allowed again.'''
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        '''Init, opens after failure_threshold failures in a row.'''
+
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._failures = 0
+        self._open_until = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+
+    def allow(self) -> bool:
+        '''Checks if a request can be made, every allowed request must be followed by a call to
+           record_success, record_failure or record_cancel.'''
+
+        with self._lock:
+            if self._open_until is None:
+                return True
+
+            # Only one request is used to check if the host is back
+            if self._probing or time.monotonic() < self._open_until:
+                return False
+
+            self._probing = True
+            return True
+
+
+    def is_open(self) -> bool:
+        '''Checks if requests to the host are currently being stopped.'''
+
+        return self._open_until is not None
+
+
+    def record_success(self) -> None:
+        '''Records that the host responded, which closes the breaker.'''
+
+        with self._lock:
+            self._failures = 0
+            self._open_until = None
+            self._probing = False
+
+
+    def record_cancel(self) -> None:
+        '''Records that an allowed request wasn't made or was given up on by the client,
+           so another request can be let through to check the host.'''
+
+        with self._lock:
+            self._probing = False
+
+
+    def record_failure(self) -> None:
+        '''Records a timeout, connection error or server error from the host.'''
+
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+
+            if self._failures >= self._failure_threshold:
+                if self._open_until is None:
+                    _logger.warning("Too many failed requests in a row, " \
+                        "waiting %d seconds before trying again.", self._reset_timeout)
+                self._open_until = time.monotonic() + self._reset_timeout
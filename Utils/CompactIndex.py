@@ -0,0 +1,181 @@
+'''Compact Index'''
+
+import bisect
+import mmap
+import os
+import struct
+import sys
+
+# Values are stored as a single byte, using their position in this list.
+# These match the possible ProtonDB ranks, in the order they are sorted in Steam.
+TIERS = ["native", "platinum", "gold", "silver", "bronze", "pending", "unrated", "borked"]
+
+# Stored for values which aren't in the list of values the index was written with
+_UNKNOWN_VALUE = 0xFF
+
+# Magic, count, generation, and 1 if there are expiry times.
+# Files from older versions aren't read, so they are written again.
+_MAGIC = b"PDBTIDX3"
+_HEADER = struct.Struct("<8sIII")
+_UINT32 = struct.Struct("<I")
+
+
+def can_index(app_id: str) -> bool:
+    '''Checks if the app ID can be stored in an index.'''
+
+    return str(app_id).isdigit() and int(app_id) < 2**32
+
+
+def write_compact_index(index_path: str, values: dict, value_names: list = None,
+    expiries: dict = None, generation: int = 0) -> None:
+    '''Writes a dict of app ID to value to the index file, values are one of value_names
+       which defaults to TIERS. Optionally a dict of app ID to the time it expires can be stored
+       as well, along with a generation number to tell which version of the data it was written
+       from.\n
+       The file is a sorted array of app IDs followed by an array of expiry times and an array of
+       values, so it can be searched without reading all of it. App IDs which can't be stored are
+       skipped.'''
+
+    value_names = TIERS if value_names is None else value_names
+    value_numbers = {value: number for number, value in enumerate(value_names)}
+
+    entries = sorted(
+        (int(app_id), value_numbers.get(value, _UNKNOWN_VALUE),
+            int(expiries.get(app_id, 0)) if expiries is not None else 0)
+        for app_id, value in values.items() if can_index(app_id)
+    )
+
+    temp_path = index_path + ".tmp"
+    with open(temp_path, mode="wb") as index_file:
+        index_file.write(_HEADER.pack(_MAGIC, len(entries), generation, expiries is not None))
+        index_file.write(struct.pack(f"<{len(entries)}I", *(app_id for (app_id, _, _) in entries)))
+        if expiries is not None:
+            index_file.write(struct.pack(f"<{len(entries)}I",
+                *(min(max(expiry, 0), 2**32 - 1) for (_, _, expiry) in entries)))
+        index_file.write(bytes(value for (_, value, _) in entries))
+
+    os.replace(temp_path, index_path)
+
+
+class CompactIndex: # pylint: disable=too-many-instance-attributes
+    '''Read only view of an index file written by write_compact_index.\n
+       The file is memory mapped and searched in place, so opening it is instant.'''
+
+    def __init__(self, index_path: str, value_names: list = None):
+        '''Init, value_names must be the same as the index was written with.\n
+           Raises ValueError if the file is not a valid index.'''
+
+        self._value_names = TIERS if value_names is None else value_names
+        self._count = 0
+        self._generation = 0
+        self._app_ids = None
+        self._mmap = None
+
+        with open(index_path, mode="rb") as index_file:
+            if os.fstat(index_file.fileno()).st_size < _HEADER.size:
+                raise ValueError(f"Invalid index file: '{index_path}'")
+
+            self._mmap = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mmap[:len(_MAGIC)] != _MAGIC:
+            self._mmap.close()
+            raise ValueError(f"Invalid index file: '{index_path}'")
+
+        (_, self._count, self._generation, has_expiries) = _HEADER.unpack_from(self._mmap, 0)
+        self._app_ids_start = _HEADER.size
+
+        self._expiries_start = self._app_ids_start + self._count * _UINT32.size
+        self._values_start = self._expiries_start
+        if has_expiries:
+            self._values_start += self._count * _UINT32.size
+
+        if len(self._mmap) != self._values_start + self._count:
+            self._mmap.close()
+            raise ValueError(f"Invalid index file: '{index_path}'")
+
+        # The app IDs can be searched directly when the file matches the byte order of the CPU
+        if sys.byteorder == "little" and self._app_ids_start % _UINT32.size == 0:
+            self._app_ids = memoryview(self._mmap)[self._app_ids_start:self._expiries_start] \
+                .cast("I")
+
+        self._has_expiries = has_expiries
+
+
+    def __len__(self) -> int:
+        return self._count
+
+
+    def get_generation(self) -> int:
+        '''Gets the generation number the index was written with.'''
+
+        return self._generation
+
+
+    def _find(self, app_id: int) -> int:
+        '''private: Binary search for the position of the app ID, -1 if it isn't in the index.'''
+
+        if self._app_ids is not None:
+            position = bisect.bisect_left(self._app_ids, app_id)
+            if position < self._count and self._app_ids[position] == app_id:
+                return position
+            return -1
+
+        low = 0
+        high = self._count
+
+        while low < high:
+            middle = (low + high) // 2
+            (middle_app_id,) = _UINT32.unpack_from(self._mmap,
+                self._app_ids_start + middle * _UINT32.size)
+
+            if middle_app_id < app_id:
+                low = middle + 1
+            elif middle_app_id > app_id:
+                high = middle
+            else:
+                return middle
+
+        return -1
+
+
+    def get_entry(self, app_id: str) -> tuple: # [any, int]
+        '''Gets the value and expiry time for the app, or None if it is not in the index.\n
+           The value is None if it wasn't one of the values the index was written with,
+           and the expiry time is None if the index doesn't have them.'''
+
+        if not can_index(app_id):
+            return None
+
+        position = self._find(int(app_id))
+        if position < 0:
+            return None
+
+        value_number = self._mmap[self._values_start + position]
+        value = None
+        if value_number < len(self._value_names):
+            value = self._value_names[value_number]
+
+        expiry = None
+        if self._has_expiries:
+            (expiry,) = _UINT32.unpack_from(self._mmap,
+                self._expiries_start + position * _UINT32.size)
+
+        return (value, expiry)
+
+
+    def get(self, app_id: str):
+        '''Gets the value for the app, or None if it is not in the index.'''
+
+        entry = self.get_entry(app_id)
+        return None if entry is None else entry[0]
+
+
+    def close(self) -> None:
+        '''Closes the index file.'''
+
+        # The memory map can't be closed while the app IDs are still being viewed
+        if self._app_ids is not None:
+            self._app_ids.release()
+            self._app_ids = None
+
+        self._mmap.close()
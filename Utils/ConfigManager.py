@@ -23,21 +23,41 @@ class ConfigManager:
 
         return config_path
 
+    def __init__(self):
+        '''Init, the config is read the first time a value is needed.'''
+
+        self._config_path = os.path.join(self._get_config_path(), "config.json")
+        self._config = None
+
+    def _load_config(self) -> dict:
+        '''private: Reads the config file the first time it is needed,
+           after that the values are kept in memory.'''
+
+        if self._config is None:
+            self._config = {}
+
+            if os.path.exists(self._config_path):
+                with open(self._config_path, encoding="utf-8") as config_file:
+                    self._config = json.load(config_file)
+            else:
+                print("\nExisting config not found.")
+                print(f"Config will be created here: {self._config_path}")
+
+        return self._config
+
+    def _save_config(self) -> None:
+        '''private: Writes the values in memory to the config file.'''
+
+        with open(self._config_path, mode='w', encoding="utf-8") as config_file:
+            json.dump(self._config, config_file)
+
     def get_steam_id(self) -> str:
         '''Gets the Steam ID for the current user.\n
            If value not found in the config will prompt user to enter a new one.'''
 
-        config_path = os.path.join(self._get_config_path(), "config.json")
-        config = {}
-
-        if os.path.exists(config_path):
-            with open(config_path, encoding="utf-8") as config_file:
-                config = json.load(config_file)
-            if "steam_id" in config:
-                return config["steam_id"]
-        else:
-            print("\nExisting config not found.")
-            print(f"Config will be created here: {config_path}")
+        config = self._load_config()
+        if "steam_id" in config:
+            return config["steam_id"]
 
         print("\nPlease go here to find your steamID64 (should look similar to " + \
             "76561197960287930): https://www.steamidfinder.com")
@@ -45,9 +65,7 @@ class ConfigManager:
         steam_id = input("steamID64: ")
 
         config["steam_id"] = steam_id
-
-        with open(config_path, mode='w', encoding="utf-8") as config_file:
-            json.dump(config, config_file)
+        self._save_config()
 
         return steam_id
 
@@ -55,17 +73,9 @@ class ConfigManager:
         '''Gets the Steam API key for the current user.\n
            If value not found in the config will prompt user to enter a new one.'''
 
-        config_path = os.path.join(self._get_config_path(), "config.json")
-        config = {}
-
-        if os.path.exists(config_path):
-            with open(config_path, encoding="utf-8") as config_file:
-                config = json.load(config_file)
-            if "steam_api_key" in config:
-                return config["steam_api_key"]
-        else:
-            print("\nExisting config not found.")
-            print(f"Config will be created here: {config_path}")
+        config = self._load_config()
+        if "steam_api_key" in config:
+            return config["steam_api_key"]
 
         print("\nDue to recent changes in Steam, it has become more difficult to get an " + \
             "accurate list of the games in your library.")
@@ -79,19 +89,14 @@ class ConfigManager:
         api_key = getpass("Api key (not shown): ")
 
         config["steam_api_key"] = api_key
-
-        with open(config_path, mode='w', encoding="utf-8") as config_file:
-            json.dump(config, config_file)
+        self._save_config()
 
         return api_key
 
     def clear_config(self) -> None:
         '''Clears the local config file, allowing new values to be set.'''
 
-        config_path = os.path.join(self._get_config_path(), "config.json")
-        config = {}
-
         print("Clearing current config...")
 
-        with open(config_path, mode='w', encoding="utf-8") as config_file:
-            json.dump(config, config_file)
+        self._config = {}
+        self._save_config()
@@ -0,0 +1,220 @@
+'''HTTP Client'''
+
+import logging
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from Utils.CircuitBreaker import CircuitBreaker, CircuitOpenError
+from Utils.MetricsManager import LATENCY_BUCKETS
+from Utils.RateLimiter import RATE_LIMITS, RateLimiter
+
+_logger = logging.getLogger(__name__)
+
+
+class DeadlineError(requests.Timeout):
+    '''Raised when a request couldn't be made or finished in the time it was given.'''
+
+
+class HttpClient: # pylint: disable=too-many-instance-attributes
+    '''HTTP Client, all requests to ProtonDB and Steam should go through this.\n
+       Keeps a persistent session for each host so connections are reused between requests,
+       along with a rate limiter and circuit breaker for each host which only this client uses.'''
+
+    def __init__(self, pool_size: int = 10, timeout: float = 3,
+        user_agent: str = "https://github.com/CorruptComputer/ProtonDB-Tags"):
+        '''Init, pool_size should be at least the number of workers used.'''
+
+        self._pool_size = pool_size
+        self._timeout = timeout
+        self._user_agent = user_agent
+        self._sessions = {}
+        self._host_stats = {}
+        self._rate_limits = dict(RATE_LIMITS)
+        self._rate_limiters = {}
+        self._circuit_breakers = {}
+        self._lock = threading.Lock()
+
+
+    def set_rate_limit(self, host: str, max_requests: int, period: float) -> None:
+        '''Sets the limit for a host, must be called before any requests are made to it.'''
+
+        with self._lock:
+            self._rate_limits[host] = (max_requests, period)
+            self._rate_limiters.pop(host, None)
+
+
+    def _get_rate_limiter(self, host: str) -> RateLimiter:
+        '''private: Gets the rate limiter for the host, creating it if needed.'''
+
+        with self._lock:
+            if host not in self._rate_limiters:
+                (max_requests, period) = self._rate_limits.get(host, (0, 0.0))
+                self._rate_limiters[host] = RateLimiter(max_requests, period)
+
+            return self._rate_limiters[host]
+
+
+    def _get_circuit_breaker(self, host: str) -> CircuitBreaker:
+        '''private: Gets the circuit breaker for the host, creating it if needed.'''
+
+        with self._lock:
+            if host not in self._circuit_breakers:
+                self._circuit_breakers[host] = CircuitBreaker()
+
+            return self._circuit_breakers[host]
+
+
+    def _get_session(self, host: str) -> requests.Session:
+        '''private: Gets the session for the host, creating it if needed.'''
+
+        with self._lock:
+            if host not in self._sessions:
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self._pool_size)
+                session = requests.Session()
+                session.headers["User-Agent"] = self._user_agent
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+
+                self._sessions[host] = (session, adapter)
+                self._host_stats[host] = {
+                    "requests": 0,
+                    "errors": 0,
+                    "status_codes": {},
+                    # The last bucket is for anything slower than all of LATENCY_BUCKETS
+                    "latency_buckets": [0] * (len(LATENCY_BUCKETS) + 1),
+                    "latency_sum": 0.0,
+                }
+
+            self._host_stats[host]["requests"] += 1
+            return self._sessions[host][0]
+
+
+    def get(self, url: str, headers: dict = None, timeout: float = None) -> requests.Response:
+        '''Makes a GET request, waiting for the rate limiter of the host first.\n
+           timeout is the most time the request can take including waiting for the rate limiter,
+           the client's own timeout still applies to the request itself.
+           Raises the same exceptions as requests.get, CircuitOpenError without making the
+           request if the host has failed too many times in a row, or DeadlineError if timeout
+           runs out.'''
+
+        host = urlparse(url).netloc
+        give_up_at = None if timeout is None else time.monotonic() + timeout
+
+        if timeout is not None and timeout <= 0:
+            raise DeadlineError(f"No time left for a request to {host}")
+
+        circuit_breaker = self._get_circuit_breaker(host)
+        if not circuit_breaker.allow():
+            raise CircuitOpenError(f"Too many failed requests to {host}")
+
+        session = self._get_session(host)
+
+        rate_limiter = self._get_rate_limiter(host)
+        if not rate_limiter.acquire(timeout):
+            # The circuit breaker is waiting to hear back if this was the request let through
+            circuit_breaker.record_cancel()
+            raise DeadlineError(f"No time left for a request to {host}")
+
+        # Shortened if there is less time left than the client's own timeout
+        request_timeout = self._timeout
+        if give_up_at is not None:
+            request_timeout = min(max(give_up_at - time.monotonic(), 0.001), self._timeout)
+
+        request_start = time.perf_counter()
+        try:
+            response = session.get(url, timeout=request_timeout, headers=headers)
+        except requests.Timeout as e:
+            self._record_response(host, None, time.perf_counter() - request_start)
+
+            # Running out of the time it was given doesn't mean the host is failing
+            if request_timeout < self._timeout:
+                circuit_breaker.record_cancel()
+                raise DeadlineError(f"No time left for the request to {host}") from e
+
+            circuit_breaker.record_failure()
+            raise
+        except requests.RequestException:
+            circuit_breaker.record_failure()
+            self._record_response(host, None, time.perf_counter() - request_start)
+            raise
+
+        if response.status_code >= 500:
+            circuit_breaker.record_failure()
+        else:
+            circuit_breaker.record_success()
+
+        self._record_response(host, response.status_code, time.perf_counter() - request_start)
+        rate_limiter.report(response.status_code, response.headers.get("Retry-After"))
+
+        return response
+
+
+    def _record_response(self, host: str, status_code: int, latency: float) -> None:
+        '''private: Counts the response in the stats for the host,
+           status_code is None if the request failed without a response.'''
+
+        bucket = len(LATENCY_BUCKETS)
+        for position, upper_bound in enumerate(LATENCY_BUCKETS):
+            if latency <= upper_bound:
+                bucket = position
+                break
+
+        with self._lock:
+            host_stats = self._host_stats[host]
+            host_stats["latency_buckets"][bucket] += 1
+            host_stats["latency_sum"] += latency
+
+            # Games which ProtonDB doesn't know about are 404, so those aren't errors
+            if status_code is None or status_code == 429 or status_code >= 500:
+                host_stats["errors"] += 1
+
+            if status_code is not None:
+                status_codes = host_stats["status_codes"]
+                status_codes[status_code] = status_codes.get(status_code, 0) + 1
+
+
+    def get_stats(self) -> dict:
+        '''Gets the number of requests made to each host,
+           along with how many of those opened a new connection or reused an existing one,
+           how many responses there were with each status code, how many failed or were
+           rate limited,
+           and how many took up to each of LATENCY_BUCKETS.'''
+
+        stats = {}
+
+        with self._lock:
+            for host, (_, adapter) in self._sessions.items():
+                new_connections = 0
+                for pool_key in adapter.poolmanager.pools.keys():
+                    new_connections += adapter.poolmanager.pools[pool_key].num_connections
+
+                host_stats = self._host_stats[host]
+                stats[host] = {
+                    "requests": host_stats["requests"],
+                    "new_connections": new_connections,
+                    "reused_connections": max(host_stats["requests"] - new_connections, 0),
+                    "status_codes": dict(sorted(host_stats["status_codes"].items())),
+                    "errors": host_stats["errors"],
+                    "latency_buckets": list(host_stats["latency_buckets"]),
+                    "latency_sum": host_stats["latency_sum"],
+                }
+
+        return stats
+
+
+    def log_stats(self) -> None:
+        '''Logs a summary of the requests made to each host.'''
+
+        for host, host_stats in self.get_stats().items():
+            _logger.info("%s: %d requests, %d new connections, %d reused", host,
+                host_stats["requests"], host_stats["new_connections"],
+                host_stats["reused_connections"])
+
+            if host_stats["status_codes"]:
+                status_codes = ", ".join(f"{count} x {status_code}"
+                    for status_code, count in host_stats["status_codes"].items())
+                _logger.info("%s: responses %s", host, status_codes)
@@ -0,0 +1,76 @@
+'''Manifest Manager'''
+
+import hashlib
+import json
+import logging
+import os
+import time
+
+_logger = logging.getLogger(__name__)
+
+
+class ManifestManager:
+    '''Manifest Manager, remembers which games were tagged on the last run of a sharedconfig
+       so the next run only has to look at what has changed.'''
+
+    def __init__(self, cache_path: str, sharedconfig_path: str, options: dict):
+        '''Init, loads the manifest for the sharedconfig if found.\n
+           If the options used to tag the games have changed, the old manifest is ignored.'''
+
+        manifests_path = os.path.join(cache_path, "manifests")
+        if not os.path.isdir(manifests_path):
+            os.makedirs(manifests_path)
+
+        # One manifest per sharedconfig, as there may be more than one Steam user
+        path_hash = hashlib.sha1(os.path.realpath(sharedconfig_path).encode("utf-8")).hexdigest()
+        self._manifest_path = os.path.join(manifests_path, f"{path_hash}.json")
+        self._options = options
+        self._apps = {}
+
+        if os.path.exists(self._manifest_path):
+            try:
+                with open(self._manifest_path, encoding="utf-8") as manifest_json:
+                    manifest = json.load(manifest_json)
+
+                if manifest.get("options") == options:
+                    self._apps = manifest.get("apps", {})
+            except json.JSONDecodeError:
+                _logger.warning("Error reading run manifest, all games will be checked...")
+
+
+    def get_changes(self, app_ids: list) -> tuple: # [list, list]
+        '''Compares the apps from the last run to app_ids.\n
+           Returns the apps which need to be tagged (new, or their rating has expired)
+           and the apps which have been removed since the last run.'''
+
+        now = int(time.time())
+        apps_to_tag = []
+
+        for app_id in app_ids:
+            manifest_app = self._apps.get(app_id)
+            if manifest_app is None or manifest_app["time_to_check"] <= now:
+                apps_to_tag.append(app_id)
+
+        removed_apps = list(self._apps.keys() - set(app_ids))
+
+        return (apps_to_tag, removed_apps)
+
+
+    def set_rating(self, app_id: str, rating: str, time_to_check: int) -> None:
+        '''Records the rating the app was tagged with, and when it needs to be checked again.'''
+
+        self._apps[app_id] = {"rating": rating, "time_to_check": time_to_check}
+
+
+    def remove_apps(self, app_ids: list) -> None:
+        '''Forgets about apps which are no longer in the sharedconfig.'''
+
+        for app_id in app_ids:
+            self._apps.pop(app_id, None)
+
+
+    def save_manifest(self) -> None:
+        '''Writes the manifest to the disk.'''
+
+        with open(self._manifest_path, mode='w', encoding="utf-8") as manifest_file:
+            json.dump({"options": self._options, "apps": self._apps}, manifest_file)
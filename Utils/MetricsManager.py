@@ -0,0 +1,162 @@
+'''Metrics Manager'''
+
+import contextlib
+import json
+import os
+import time
+
+_PREFIX = "protondb_tags"
+
+# Upper bounds in seconds of the buckets for the request latency histograms
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+
+def _escape_label(value: str) -> str:
+    '''private: Escapes a Prometheus label value.'''
+
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _write_file(path: str, text: str) -> None:
+    '''private: Writes the file through a temporary file, so it is never read half written.'''
+
+    temp_path = path + ".tmp"
+    with open(temp_path, mode="w", encoding="utf-8") as metrics_file:
+        metrics_file.write(text)
+
+    os.replace(temp_path, path)
+
+
+class MetricsManager:
+    '''Metrics Manager, records how long each phase of a run takes,
+       and writes them with the cache and request stats for graphing and alerting.'''
+
+    def __init__(self):
+        '''Init, the run is timed from here.'''
+
+        self._start_time = time.time()
+        self._phases = {}
+        self._counts = {}
+
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        '''Times the code in the with block as part of the named phase,
+           phases which are run more than once are added together.'''
+
+        phase_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._phases[name] = self._phases.get(name, 0.0) + time.perf_counter() - phase_start
+
+
+    def set_count(self, name: str, value: int) -> None:
+        '''Records a count for the run, such as the number of games found.'''
+
+        self._counts[name] = value
+
+
+    def get_metrics(self, cache_stats: dict, http_stats: dict) -> dict:
+        '''Gets all of the metrics for the run.\n
+           cache_stats is from CacheManager.get_stats,
+           and http_stats is from HttpClient.get_stats, or empty if no requests could be made.'''
+
+        http_metrics = {}
+        for host, host_stats in http_stats.items():
+            # Cumulative counts, the same as Prometheus histograms
+            latency_buckets = {}
+            total = 0
+            for upper_bound, count in zip(LATENCY_BUCKETS + ["+Inf"],
+                host_stats["latency_buckets"]):
+                total += count
+                latency_buckets[str(upper_bound)] = total
+
+            http_metrics[host] = {
+                "requests": host_stats["requests"],
+                "errors": host_stats["errors"],
+                "new_connections": host_stats["new_connections"],
+                "reused_connections": host_stats["reused_connections"],
+                "status_codes": {str(code): count
+                    for code, count in host_stats["status_codes"].items()},
+                "latency_seconds": {"buckets": latency_buckets,
+                    "sum": round(host_stats["latency_sum"], 6), "count": total},
+            }
+
+        return {
+            "timestamp": int(self._start_time),
+            "duration_seconds": round(time.time() - self._start_time, 6),
+            "counts": dict(self._counts),
+            "phases_seconds": {name: round(seconds, 6) for name, seconds in self._phases.items()},
+            "caches": {table: table_stats for table, table_stats in cache_stats.items()
+                if isinstance(table_stats, dict)},
+            "cache_saves": cache_stats["saves"],
+            "cache_save_seconds": round(cache_stats["save_seconds"], 6),
+            "http": http_metrics,
+        }
+
+
+    def write_json(self, path: str, metrics: dict) -> None:
+        '''Writes the metrics from get_metrics as JSON.'''
+
+        _write_file(path, json.dumps(metrics, indent=2) + "\n")
+
+
+    def write_prometheus(self, path: str, metrics: dict) -> None:
+        '''Writes the metrics from get_metrics in the Prometheus text format,
+           for the node exporter textfile collector.'''
+
+        lines = []
+
+        def add_metric(name: str, metric_type: str, help_text: str, samples: list) -> None:
+            lines.append(f"# HELP {_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {_PREFIX}_{name} {metric_type}")
+            for (suffix, labels, value) in samples:
+                label_text = ",".join(f'{key}="{_escape_label(label)}"'
+                    for key, label in labels.items())
+                label_text = f"{{{label_text}}}" if label_text else ""
+                lines.append(f"{_PREFIX}_{name}{suffix}{label_text} {value}")
+
+        add_metric("last_run_timestamp_seconds", "gauge", "When the last run started.",
+            [("", {}, metrics["timestamp"])])
+        add_metric("run_duration_seconds", "gauge", "How long the last run took.",
+            [("", {}, metrics["duration_seconds"])])
+        add_metric("games", "gauge", "Number of games in the last run.",
+            [("", {"kind": name}, value) for name, value in metrics["counts"].items()])
+        add_metric("phase_duration_seconds", "gauge", "How long each phase of the last run took.",
+            [("", {"phase": name}, value) for name, value in metrics["phases_seconds"].items()])
+
+        add_metric("cache_lookups", "gauge", "Cache lookups in the last run, by result.",
+            [("", {"cache": table, "result": result}, count)
+                for table, table_stats in metrics["caches"].items()
+                for result, count in table_stats.items()])
+        add_metric("cache_saves", "gauge", "Number of times the caches were saved in the last run.",
+            [("", {}, metrics["cache_saves"])])
+        add_metric("cache_save_duration_seconds", "gauge",
+            "Time spent saving the caches in the last run.",
+            [("", {}, metrics["cache_save_seconds"])])
+
+        http_metrics = metrics["http"]
+        add_metric("http_requests", "gauge", "Requests made in the last run, by host.",
+            [("", {"host": host}, host_stats["requests"])
+                for host, host_stats in http_metrics.items()])
+        add_metric("http_errors", "gauge",
+            "Requests which failed, were rate limited or had a server error in the last run.",
+            [("", {"host": host}, host_stats["errors"])
+                for host, host_stats in http_metrics.items()])
+        add_metric("http_responses", "gauge", "Responses in the last run, by host and status.",
+            [("", {"host": host, "code": code}, count)
+                for host, host_stats in http_metrics.items()
+                for code, count in host_stats["status_codes"].items()])
+
+        latency_samples = []
+        for host, host_stats in http_metrics.items():
+            latency = host_stats["latency_seconds"]
+            for upper_bound, count in latency["buckets"].items():
+                latency_samples.append(("_bucket", {"host": host, "le": upper_bound}, count))
+            latency_samples.append(("_sum", {"host": host}, latency["sum"]))
+            latency_samples.append(("_count", {"host": host}, latency["count"]))
+        add_metric("http_request_duration_seconds", "histogram",
+            "Request latency in the last run, by host.", latency_samples)
+
+        _write_file(path, "\n".join(lines) + "\n")
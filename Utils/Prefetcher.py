@@ -0,0 +1,94 @@
+'''Prefetcher'''
+
+import logging
+import queue
+import sqlite3
+import threading
+
+_logger = logging.getLogger(__name__)
+
+# Most app IDs waiting to be fetched, reading the file waits for the workers when it is full
+QUEUE_SIZE = 1000
+
+
+class Prefetcher:
+    '''Gets ratings in background threads while the sharedconfigs are still being read,
+       so reading the files and waiting on the network happen at the same time.\n
+       Every app added is fetched unless stop is called first, the ones still waiting then are
+       returned by stop to be fetched as usual.'''
+
+    def __init__(self, get_rating, workers: int):
+        '''Init, get_rating is called with each app ID from the worker threads to get its rating,
+           it can return None to leave the app to be fetched later.'''
+
+        self._get_rating = get_rating
+        self._queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self._added = {}
+        self._ratings = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+        self._threads = [threading.Thread(target=self._run, daemon=True)
+            for _ in range(max(workers, 1))]
+        for thread in self._threads:
+            thread.start()
+
+
+    def _run(self) -> None:
+        '''private: Gets the ratings for the apps in the queue until stop is called.'''
+
+        import requests # pylint: disable=import-outside-toplevel
+
+        while True:
+            app_id = self._queue.get()
+            if app_id is None or self._stopping.is_set():
+                return
+
+            # A worker stopping here would leave add waiting on the queue forever, the app is
+            # fetched again later where request and cache errors are reported
+            try:
+                rating = self._get_rating(app_id)
+            except (requests.RequestException, sqlite3.Error):
+                rating = None
+            except:
+                _logger.exception("%s | Unexpected error fetching the rating in the background.",
+                    app_id)
+                rating = None
+
+            if rating is not None:
+                with self._lock:
+                    self._ratings[app_id] = rating
+
+
+    def add(self, app_id: str) -> None:
+        '''Adds an app to be fetched, waiting for room in the queue if the workers are behind.'''
+
+        if app_id in self._added:
+            return
+        self._added[app_id] = None
+
+        self._queue.put(app_id)
+
+
+    def stop(self) -> tuple: # [dict, list]
+        '''Stops fetching, and waits for the ratings already being fetched.\n
+           Returns a dict of app ID to rating, and a list of the app IDs which were still waiting
+           in the queue, or whose rating was left to be fetched later.'''
+
+        self._stopping.set()
+
+        try:
+            while True:
+                self._queue.get_nowait()
+        except queue.Empty:
+            pass
+
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+        with self._lock:
+            ratings = dict(self._ratings)
+
+        return (ratings, [app_id for app_id in self._added if app_id not in ratings])
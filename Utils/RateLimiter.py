@@ -0,0 +1,88 @@
+'''Rate Limiter'''
+
+import threading
+import time
+from collections import deque
+
+
+class RateLimiter:
+    '''Token bucket shared between all of the requests an HTTP client makes to a single host.\n
+       Each request takes a token, and each token is returned one period after it was taken.
+       This allows bursts of up to max_requests, while never making more than max_requests
+       requests in any period.'''
+
+    def __init__(self, max_requests: int, period: float):
+        '''Init, allows max_requests per period seconds. A max_requests of 0 disables the limit.'''
+
+        self._max_requests = max_requests
+        self._period = period
+        self._taken = deque()
+        self._backoff = 0.0
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+
+    def acquire(self, timeout: float = None) -> bool:
+        '''Blocks until a request is allowed to be made.\n
+           If timeout is given waits for at most that many seconds, returns False if a request
+           still isn't allowed by then.'''
+
+        if self._max_requests <= 0:
+            return True
+
+        give_up_at = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+
+                # Return any tokens which were taken more than a period ago
+                while self._taken and self._taken[0] <= now - self._period:
+                    self._taken.popleft()
+
+                wait = self._blocked_until - now
+                if wait <= 0 and len(self._taken) < self._max_requests:
+                    self._taken.append(now)
+                    return True
+
+                if wait <= 0:
+                    wait = self._taken[0] + self._period - now
+
+                if give_up_at is not None:
+                    if now >= give_up_at:
+                        return False
+                    wait = min(wait, give_up_at - now)
+
+            time.sleep(wait)
+
+
+    def report(self, status_code: int, retry_after: str = None) -> None:
+        '''Adjusts the limiter based on the status code of a response.\n
+           429 and 5xx responses stop all requests for a while, doubling each time they repeat.
+           Any other response resets the backoff.'''
+
+        if self._max_requests <= 0:
+            return
+
+        with self._lock:
+            if status_code != 429 and status_code < 500:
+                self._backoff = 0.0
+                return
+
+            self._backoff = min(max(self._backoff * 2, self._period), 300.0)
+            backoff = self._backoff
+
+            # Retry-After is allowed to be a date, only the number of seconds is supported here
+            if retry_after and retry_after.isdigit():
+                backoff = max(backoff, float(retry_after))
+
+            self._blocked_until = max(self._blocked_until, time.monotonic() + backoff)
+
+
+# Steam only allows 10 requests per 10 seconds, otherwise you get rate limited for a few minutes.
+# ProtonDB doesn't publish a limit, so this is kept to something reasonable.
+# Each HTTP client starts with these, hosts without an entry are not limited.
+RATE_LIMITS = {
+    "store.steampowered.com": (10, 10.0),
+    "www.protondb.com": (10, 1.0),
+}
@@ -0,0 +1,203 @@
+'''Reports Manager'''
+
+import bz2
+import codecs
+import gzip
+import heapq
+import json
+import logging
+import lzma
+import os
+import tarfile
+
+from Utils.CompactIndex import CompactIndex, write_compact_index
+
+_logger = logging.getLogger(__name__)
+
+# Only the most recent reports for each game are used, similar to ProtonDB's trending tier
+RECENT_REPORTS = 10
+
+_SCORES = {"borked": 0, "bronze": 1, "silver": 2, "gold": 3, "platinum": 4}
+_TIERS_BY_SCORE = ["borked", "bronze", "silver", "gold", "platinum"]
+
+_OPENERS = {
+    ".gz": gzip.open,
+    ".bz2": bz2.open,
+    ".xz": lzma.open,
+}
+
+
+def _iter_json_objects(text_stream, chunk_size: int = 1 << 20):
+    '''private: Yields each object from a stream of JSON, without reading all of it at once.\n
+       Supports both a JSON array of objects and newline delimited JSON.'''
+
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    end_of_stream = False
+
+    while True:
+        # Skip anything between the objects, which is whitespace or the array syntax
+        while position < len(buffer) and buffer[position] in " \t\r\n[],":
+            position += 1
+
+        if position < len(buffer):
+            try:
+                (obj, position) = decoder.raw_decode(buffer, position)
+                yield obj
+                continue
+            except json.JSONDecodeError:
+                # Most likely the object continues in the next chunk
+                if end_of_stream:
+                    raise
+
+        if end_of_stream:
+            return
+
+        chunk = text_stream.read(chunk_size)
+        end_of_stream = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+
+def _iter_dump_reports(dump_path: str):
+    '''private: Yields each report from a ProtonDB reports dump.\n
+       The dump can be JSON or NDJSON, optionally compressed or in a tar archive.'''
+
+    if tarfile.is_tarfile(dump_path):
+        # Stream mode, so the archive is only read through once
+        with tarfile.open(dump_path, mode="r|*") as dump_tar:
+            for member in dump_tar:
+                if member.isfile() and ".json" in member.name:
+                    member_file = dump_tar.extractfile(member)
+                    yield from _iter_json_objects(codecs.getreader("utf-8")(member_file))
+        return
+
+    opener = _OPENERS.get(os.path.splitext(dump_path)[1], open)
+    with opener(dump_path, mode="rt", encoding="utf-8") as dump_file:
+        yield from _iter_json_objects(dump_file)
+
+
+def _get_report_app_id(report: dict) -> str:
+    '''private: Gets the Steam app ID for a report, or None if it doesn't have one.'''
+
+    app_id = report.get("appId")
+    if app_id is None:
+        app_id = report.get("app", {}).get("steam", {}).get("appId")
+
+    if app_id is None or not str(app_id).isdigit():
+        return None
+
+    return str(app_id)
+
+
+def _get_report_timestamp(report: dict) -> int:
+    '''private: Gets the time a report was made, 0 if it doesn't have one,
+       or None if it isn't a number.'''
+
+    try:
+        return int(report.get("timestamp", 0))
+    except (TypeError, ValueError):
+        return None
+
+
+def _get_report_score(report: dict) -> int:
+    '''private: Gets a score from 0 (borked) to 4 (platinum) for a report,
+       or None if the report doesn't say how well the game ran.'''
+
+    # Older reports have the rating directly
+    if "rating" in report:
+        return _SCORES.get(str(report["rating"]).lower())
+
+    responses = report.get("responses", {})
+    if responses.get("verdict") == "no":
+        return _SCORES["borked"]
+    if responses.get("verdict") != "yes":
+        return None
+
+    faults = sum(1 for key, value in responses.items()
+        if (key.endswith("Faults") or key == "significantBugs") and value == "yes")
+
+    if faults == 0:
+        # Works without any faults, platinum if it also worked without any tinkering
+        if responses.get("triedOob") == "yes" and responses.get("verdictOob") == "yes":
+            return _SCORES["platinum"]
+        return _SCORES["gold"]
+
+    return _SCORES["silver"] if faults == 1 else _SCORES["bronze"]
+
+
+class ReportsManager:
+    '''Reports Manager, computes ratings from a ProtonDB reports dump without using the API.'''
+
+    def __init__(self, index_path: str):
+        '''Init, opens the index if it has been created.'''
+
+        self._index_path = index_path
+        self._index = None
+
+        if os.path.exists(index_path):
+            try:
+                self._index = CompactIndex(index_path)
+            except ValueError:
+                _logger.warning("Error reading reports index '%s', it will need to be recreated.",
+                    index_path)
+
+
+    def ingest(self, dump_path: str) -> int:
+        '''Reads a ProtonDB reports dump and writes the rating for each game to the index.\n
+           Only the most recent reports for each game are kept in memory while reading.
+           Returns the number of games in the index.'''
+
+        # app ID => heap of (timestamp, score) for the most recent reports
+        recent_reports = {}
+        report_count = 0
+        skipped_count = 0
+
+        for report in _iter_dump_reports(dump_path):
+            app_id = _get_report_app_id(report)
+            score = _get_report_score(report)
+            if app_id is None or score is None:
+                continue
+
+            timestamp = _get_report_timestamp(report)
+            if timestamp is None:
+                skipped_count += 1
+                continue
+
+            report_count += 1
+            if report_count % 100000 == 0:
+                _logger.info("Read %d reports...", report_count)
+
+            reports = recent_reports.setdefault(app_id, [])
+            entry = (timestamp, score)
+            if len(reports) < RECENT_REPORTS:
+                heapq.heappush(reports, entry)
+            else:
+                heapq.heappushpop(reports, entry)
+
+        ratings = {}
+        for app_id, reports in recent_reports.items():
+            average = sum(score for (_, score) in reports) / len(reports)
+            ratings[app_id] = _TIERS_BY_SCORE[int(average + 0.5)]
+
+        if self._index is not None:
+            self._index.close()
+            self._index = None
+
+        write_compact_index(self._index_path, ratings)
+        self._index = CompactIndex(self._index_path)
+
+        if skipped_count:
+            _logger.warning("Skipped %d reports with an invalid timestamp.", skipped_count)
+        _logger.info("Read %d reports for %d games.", report_count, len(ratings))
+        return len(ratings)
+
+
+    def get_rating(self, app_id: str) -> str:
+        '''Gets the rating for the game from the index, or None if it isn't in there.'''
+
+        if self._index is None:
+            return None
+
+        return self._index.get(app_id)
@@ -1,14 +1,76 @@
 '''Sharedconfig Manager'''
 
+import logging
 import os
 import sys
 import vdf
 
+from Utils.VdfPatcher import parse_vdf, patch_vdf, write_atomic
+
+# The possible keys for each block on the way to the list of apps in a sharedconfig
+APPS_PATH = [
+    ["UserRoamingConfigStore", "UserLocalConfigStore"],
+    ["Software", "software"],
+    ["Valve", "valve"],
+    ["Steam", "steam"],
+    ["Apps", "apps"],
+]
+
+_logger = logging.getLogger(__name__)
+
+
+def get_key_value(possible_keys, dict_to_check: dict) -> str:
+    '''Finds which key exists in the dict.\n
+       If none of the values are found the first will be taken as a default.\n
+       possible_keys should be of type str[]'''
+
+    found_key = "Not found"
+    for key in possible_keys:
+        if key in dict_to_check:
+            found_key = key
+
+    if found_key == "Not found":
+        found_key = possible_keys[0]
+        dict_to_check[found_key] = {}
+
+    return found_key
+
+
+def get_apps_list(sharedconfig: dict, owned_games: list = None) -> dict:
+    '''Searches the sharedconfig to get a list of Steam app IDs.\n
+       Optionally adds the games from the Steam API which aren't in the sharedconfig yet.'''
+
+    # If neither value is found, the first will be taken as a default and initialized to {}
+    apps_list = sharedconfig
+    for possible_keys in APPS_PATH:
+        apps_list = apps_list[get_key_value(possible_keys, apps_list)]
+
+    if owned_games:
+        new_games = 0
+
+        # Only the games which are new need to be added
+        for app_id in owned_games:
+            if app_id not in apps_list:
+                apps_list[app_id] = {}
+                apps_list[app_id]["tags"] = {}
+                new_games += 1
+
+        _logger.info("Found %d new games from the Steam API.", new_games)
+
+    return apps_list
+
 
 class SharedconfigManager:
     '''Sharedconfig Manager'''
 
-    def _find_sharedconfig(self) -> str:
+    def __init__(self):
+        '''Init'''
+
+        # Layout of each sharedconfig when it was read, so only the changes need to be written
+        self._layouts = {}
+
+
+    def _find_userdata(self) -> str:
         '''private: Tries to find where Steam is installed on the local machine.'''
 
         possible_paths = [
@@ -36,8 +98,12 @@ class SharedconfigManager:
                 "Please pass the path to sharedconfig.vdf with the --sharedconfig parameter.")
             sys.exit()
 
-        # Some people may have more than one Steam user on their PC,
-        # this checks for that and asks which you would like to use if multiple are found
+        return base_path
+
+
+    def _find_user_ids(self, base_path: str) -> list:
+        '''private: Lists the Steam users which have logged in on the local machine.'''
+
         possible_ids = []
         for user_id in os.listdir(base_path):
             if os.path.isdir(os.path.join(base_path, user_id)):
@@ -59,6 +125,18 @@ class SharedconfigManager:
                 print(f"Found user {len(possible_ids)}: {user_id}   {username}")
                 possible_ids.append(user_id)
 
+        return possible_ids
+
+
+    def _find_sharedconfig(self) -> str:
+        '''private: Tries to find the sharedconfig for the Steam user on the local machine.'''
+
+        base_path = self._find_userdata()
+
+        # Some people may have more than one Steam user on their PC,
+        # this checks for that and asks which you would like to use if multiple are found
+        possible_ids = self._find_user_ids(base_path)
+
         user = 0
         if len(possible_ids) == 1:
             print("Only one user found.")
@@ -68,21 +146,32 @@ class SharedconfigManager:
         return os.path.join(base_path, possible_ids[int(user)], "7/remote/sharedconfig.vdf")
 
 
-    def get_sharedconfig(self, sharedconfig_path: str) -> tuple: # [str, str]
+    def find_all_sharedconfigs(self) -> list:
+        '''Finds the sharedconfig for every Steam user on the local machine.'''
+
+        base_path = self._find_userdata()
+        sharedconfig_paths = []
+
+        for user_id in self._find_user_ids(base_path):
+            sharedconfig_path = os.path.join(base_path, user_id, "7/remote/sharedconfig.vdf")
+            if os.path.exists(sharedconfig_path):
+                sharedconfig_paths.append(sharedconfig_path)
+            else:
+                print(f"No sharedconfig found for user {user_id}, skipping it.")
+
+        return sharedconfig_paths
+
+
+    def get_sharedconfig(self, sharedconfig_path: str, on_app=None) -> tuple: # [str, str]
         '''Finds and retreives the contents of the sharedconfig file.\n
-           Optionally a path can be given to use instead of searching for it.'''
+           Optionally a path can be given to use instead of searching for it.\n
+           on_app is called with each app ID as soon as it is read, while the rest of the file
+           is still being parsed.'''
 
         if sharedconfig_path:
             # With ~ for user home
             if os.path.exists(os.path.expanduser(sharedconfig_path)):
-                try:
-                    with open(sharedconfig_path, encoding="utf-8") as sharedconfig_vdf:
-                        vdf.load(sharedconfig_vdf)
-                    sharedconfig_path = os.path.expanduser(sharedconfig_path)
-
-                except:
-                    print(f"Invalid sharedconfig path: '{sharedconfig_path}'")
-                    sys.exit()
+                sharedconfig_path = os.path.expanduser(sharedconfig_path)
             else:
                 print(f"Shared config path '{sharedconfig_path}' does not exist. " + \
                     "Using default path.")
@@ -92,20 +181,72 @@ class SharedconfigManager:
             sharedconfig_path = self._find_sharedconfig()
 
         print(f"Selected: {sharedconfig_path}")
-        with open(sharedconfig_path, encoding="utf-8") as sharedconfig_vdf:
-            return (sharedconfig_path, vdf.load(sharedconfig_vdf))
 
+        try:
+            sharedconfig = self.read_sharedconfig(sharedconfig_path, on_app)
+        except ValueError:
+            print(f"Invalid sharedconfig path: '{sharedconfig_path}'")
+            sys.exit()
+
+        return (sharedconfig_path, sharedconfig)
+
+
+    def read_sharedconfig(self, sharedconfig_path: str, on_app=None) -> dict:
+        '''Reads the sharedconfig at the path, without searching for it or asking for input.\n
+           on_app is called with each app ID as soon as it is read, see get_sharedconfig.
+           Raises OSError if the file can't be read, or ValueError if it isn't a valid
+           sharedconfig.'''
 
-    def save_sharedconfig(self, sharedconfig_path: str, sharedconfig_contents: str) -> str:
+        # Reading it is also what checks that it is valid, so it only has to be read once
+        try:
+            with open(sharedconfig_path, encoding="utf-8", newline="") as sharedconfig_vdf:
+                (sharedconfig, self._layouts[sharedconfig_path]) = \
+                    parse_vdf(sharedconfig_vdf.read(), APPS_PATH, on_app)
+        except (SyntaxError, UnicodeDecodeError) as e:
+            raise ValueError(f"Invalid sharedconfig: '{sharedconfig_path}'") from e
+
+        return sharedconfig
+
+
+    def _write_sharedconfig(self, sharedconfig_path: str, sharedconfig_contents: dict) -> str:
+        '''private: Writes the sharedconfig file, returns the text which was written.\n
+           Only the changed parts of the file are written if possible,
+           otherwise output the edited vdfDict back to the original location.'''
+
+        sharedconfig_text = None
+        if sharedconfig_path in self._layouts:
+            layout = self._layouts.pop(sharedconfig_path)
+            sharedconfig_text = patch_vdf(layout, sharedconfig_contents)
+
+            # Nothing has changed, so there is no need to write it
+            if sharedconfig_text == layout.text:
+                return sharedconfig_text
+
+        if sharedconfig_text is None:
+            sharedconfig_text = vdf.dumps(sharedconfig_contents, pretty=True)
+
+        write_atomic(sharedconfig_path, sharedconfig_text)
+        return sharedconfig_text
+
+
+    def write_sharedconfig(self, sharedconfig_path: str, sharedconfig_contents: dict) -> None:
+        '''Overwrites the sharedconfig file with the updated version without prompting the user.\n
+           Unlike save_sharedconfig, Steam is not asked to import the tags.'''
+
+        sharedconfig_text = self._write_sharedconfig(sharedconfig_path, sharedconfig_contents)
+
+        # Keep the layout of what was written, so the next write only needs the changes
+        self._layouts[sharedconfig_path] = parse_vdf(sharedconfig_text)[1]
+
+
+    def save_sharedconfig(self, sharedconfig_path: str, sharedconfig_contents: str) -> bool:
         '''Overwrites the sharedconfig file with the updated version and tells Steam to import it.\n
-           Prompts the user before writing the file.'''
+           Prompts the user before writing the file, returns True if it was written.'''
 
         print("\nWARNING: This may clear your current tags on Steam!")
         check = input("Would you like to save sharedconfig.vdf? (y/N)")
         if check.lower() in ("yes", "y"):
-            # Output the edited vdfDict back to the original location
-            with open(sharedconfig_path, mode='w', encoding="utf-8") as sharedconfig_vdf:
-                vdf.dump(sharedconfig_contents, sharedconfig_vdf, pretty=True)
+            self._write_sharedconfig(sharedconfig_path, sharedconfig_contents)
 
             # Workaround provided by Valve for the new library
             resetcollections_url = "steam://resetcollections"
@@ -135,3 +276,6 @@ class SharedconfigManager:
 
             os.system(command)
             print("Please click 'Confirm' in Steam, this will import the tags into your library.")
+            return True
+
+        return False
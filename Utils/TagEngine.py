@@ -0,0 +1,909 @@
+'''Tag Engine'''
+
+from __future__ import annotations
+
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, \
+    as_completed
+from typing import TYPE_CHECKING
+from urllib.parse import urlparse
+
+from Utils.CacheManager import CacheManager
+from Utils.ReportsManager import ReportsManager
+from Utils.SharedconfigManager import SharedconfigManager, get_apps_list
+from Utils.TagPlanner import apply_tags, is_valid_app_id, plan_tags
+
+# requests takes a while to import, so it is only imported once a request needs to be made
+if TYPE_CHECKING:
+    from Utils.HttpClient import HttpClient
+
+_logger = logging.getLogger(__name__)
+
+# Number of apps to ask the Steam store API about in a single request
+STEAM_BATCH_SIZE = 50
+
+# Where the APIs are, these can be changed to use a local server for benchmarking
+STEAM_STORE_URL = "https://store.steampowered.com"
+STEAM_API_URL = "https://api.steampowered.com"
+PROTONDB_URL = "https://www.protondb.com"
+
+# Options for TagEngine, these match the command line options of the same names
+DEFAULT_OPTIONS = {
+    "check_native": False,
+    "skip_cache": False,
+    "stale_ok": False,
+    "offline": False,
+    "use_reports": False,
+    "workers": 1,
+    # time.monotonic value to stop making requests at, from --max-seconds
+    "deadline": None,
+    "protondb_rate_limit": None,
+}
+
+
+class SteamAPIError(Exception):
+    '''Raised if the Steam API won't send the games list, usually because the API key or
+       Steam ID is not valid.'''
+
+
+def get_time_left(deadline: float) -> float:
+    '''Gets the seconds left before the deadline from --max-seconds, which is a time.monotonic
+       value, 0 once it has passed. None if there is no deadline.'''
+
+    if deadline is None:
+        return None
+
+    return max(deadline - time.monotonic(), 0.0)
+
+
+def get_file_state(path: str) -> tuple:
+    '''Gets the modification time and size of a file, to tell when it has changed.
+       Returns None if the file doesn't exist.'''
+
+    try:
+        file_stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    return (file_stat.st_mtime_ns, file_stat.st_size)
+
+
+def is_native_from_appdetails(app_details: dict) -> bool:
+    '''Reads the native Linux support for a game from its Steam Store API appdetails.'''
+
+    # If steam can't find the game it will be False
+    is_success = app_details["success"]
+    is_native_game = False
+
+    if is_success in ["True", "true", True]:
+        linux_support = app_details["data"]["platforms"]["linux"]
+        is_native_game = linux_support in ["True", "true", True]
+
+    return is_native_game
+
+
+class TagEngine:
+    '''Tag Engine, gets the ratings for games and tags them in sharedconfigs.\n
+       The caches and HTTP connections are kept open between calls, so other tools can rate
+       and tag games as often as they need to without starting the script each time.
+       Nothing here asks for input or exits, progress and problems are logged with logging.'''
+
+    def __init__(self, options: dict = None, cache_manager: CacheManager = None,
+        http_client: HttpClient = None):
+        '''Init, options can contain any of DEFAULT_OPTIONS to change them.\n
+           A cache manager and HTTP client are created if they aren't given, offline there is
+           no HTTP client. Raises ValueError for unknown options.'''
+
+        unknown_options = set(options or {}) - set(DEFAULT_OPTIONS)
+        if unknown_options:
+            raise ValueError(f"Unknown options: {', '.join(sorted(unknown_options))}")
+
+        self._options = dict(DEFAULT_OPTIONS)
+        self._options.update(options or {})
+
+        # Offline any cached value is better than none
+        self._cache_manager = cache_manager
+        if self._cache_manager is None:
+            self._cache_manager = CacheManager(
+                stale_ok=self._options["stale_ok"] or self._options["offline"],
+                refresh_stale=not self._options["offline"])
+
+        self._http_client = http_client
+        if self._http_client is None and not self._options["offline"]:
+            from Utils.HttpClient import HttpClient # pylint: disable=import-outside-toplevel,redefined-outer-name
+            self._http_client = HttpClient(pool_size=max(self._options["workers"], 1))
+
+        # Only the requests made by this engine's client count towards the limit
+        if self._http_client is not None and self._options["protondb_rate_limit"] is not None:
+            self._http_client.set_rate_limit(urlparse(PROTONDB_URL).netloc,
+                self._options["protondb_rate_limit"], 1.0)
+
+        # Hosts which rejected checking several apps at once, so it isn't tried again
+        self._unbatched_hosts = set()
+        self._sharedconfig_manager = SharedconfigManager()
+
+        self._reports_manager = None
+        if self._options["use_reports"]:
+            self._reports_manager = ReportsManager(
+                os.path.join(self._cache_manager.get_base_cache_path(), "protonDBReports.idx"))
+
+
+    def get_cache_manager(self) -> CacheManager:
+        '''Gets the cache manager used for the ratings.'''
+
+        return self._cache_manager
+
+
+    def get_sharedconfig_manager(self) -> SharedconfigManager:
+        '''Gets the sharedconfig manager used to read and write the sharedconfigs, sharedconfigs
+           read with it are written by only changing the parts of the file which need to.'''
+
+        return self._sharedconfig_manager
+
+
+    def get_option(self, name: str):
+        '''Gets the value of one of DEFAULT_OPTIONS.'''
+
+        return self._options[name]
+
+
+    def get_http_client(self) -> HttpClient:
+        '''Gets the HTTP client used for requests, None if offline.'''
+
+        return self._http_client
+
+
+    def set_deadline(self, deadline: float) -> None:
+        '''Sets the time.monotonic value to stop making requests at, None for no deadline.'''
+
+        self._options["deadline"] = deadline
+
+
+    def load_sharedconfig(self, sharedconfig_path: str, on_app=None) -> dict:
+        '''Reads the sharedconfig at the path, ~ can be used for the user's home.\n
+           on_app is called with each app ID as soon as it is read. Raises OSError if the file
+           can't be read, or ValueError if it isn't a valid sharedconfig.'''
+
+        return self._sharedconfig_manager.read_sharedconfig(os.path.expanduser(sharedconfig_path),
+            on_app)
+
+
+    def write_sharedconfig(self, sharedconfig_path: str, sharedconfig: dict) -> None:
+        '''Writes the sharedconfig back to the path, only the parts of the file which changed
+           are written if it was read with load_sharedconfig.\n
+           Steam isn't asked to import the tags, it should be closed while the file is written.'''
+
+        self._sharedconfig_manager.write_sharedconfig(os.path.expanduser(sharedconfig_path),
+            sharedconfig)
+
+
+    def _is_native(self, app_id: str, skip_cache: bool) -> bool:
+        '''private: Checks if the game has Native Linux support from the Steam Store API.'''
+
+        if not skip_cache:
+            (found_in_cache, value) = self._cache_manager.get_from_steam_native_cache(app_id)
+            if found_in_cache:
+                return value
+
+        import requests # pylint: disable=import-outside-toplevel
+        from Utils.CircuitBreaker import CircuitOpenError # pylint: disable=import-outside-toplevel
+        from Utils.HttpClient import DeadlineError # pylint: disable=import-outside-toplevel
+
+        # Thanks to u/FurbyOnSteroid for finding this!
+        # https://www.reddit.com/r/linux_gaming/comments/bxqsvs/protondb_to_steam_library_tool/eqal68r/
+        api_url = f"{STEAM_STORE_URL}/api/appdetails?appids={app_id}&filters=platforms"
+        steam_response = None
+        is_native_game = False
+
+        # Steam only allows 10 requests per 10 seconds, otherwise you get rate limited for a few
+        # minutes. The HTTP client waits for this, even when using multiple workers.
+        try:
+            steam_response = self._http_client.get(api_url,
+                timeout=get_time_left(self._options["deadline"]))
+        except DeadlineError:
+            # Left for the next run, it isn't a failure of this game either
+            raise
+        except CircuitOpenError:
+            # Steam is failing, this was logged when the circuit opened and isn't a failure of
+            # this game
+            return self._cache_manager.get_last_steam_native_value(app_id)
+        except requests.Timeout:
+            _logger.warning("%s | Timed out reading Steam store page.", app_id)
+        except requests.ConnectionError:
+            _logger.warning("%s | Could not connect to Steam.", app_id)
+        except requests.RequestException as e:
+            _logger.warning("%s | An unknown error occoured with the request to Steam. %s",
+                app_id, type(e).__name__)
+
+        if steam_response:
+            if steam_response.status_code != 200:
+                _logger.warning("%s | Error reading Steam store info for game.", app_id)
+                return False
+
+            steam_api_json = steam_response.json()
+            is_native_game = is_native_from_appdetails(steam_api_json[app_id])
+
+            self._cache_manager.add_to_steam_native_cache(app_id, is_native_game)
+        else:
+            # Wait a while before asking again, longer each time it fails, keeping the last value
+            is_native_game = self._cache_manager.add_failure_to_steam_native_cache(app_id)
+
+        return is_native_game
+
+
+    def _is_native_batch(self, app_ids: list) -> dict:
+        '''private: Checks if several games have Native Linux support with a single Steam Store
+           API request.\n
+           Returns None if Steam rejects the request, otherwise a dict of app ID to native
+           support.'''
+
+        import requests # pylint: disable=import-outside-toplevel
+        from Utils.CircuitBreaker import CircuitOpenError # pylint: disable=import-outside-toplevel
+        from Utils.HttpClient import DeadlineError # pylint: disable=import-outside-toplevel
+
+        api_url = f"{STEAM_STORE_URL}/api/appdetails" + \
+            f"?appids={','.join(app_ids)}&filters=platforms"
+        steam_response = None
+
+        try:
+            steam_response = self._http_client.get(api_url,
+                timeout=get_time_left(self._options["deadline"]))
+        except DeadlineError:
+            raise
+        except CircuitOpenError:
+            return {
+                app_id: self._cache_manager.get_last_steam_native_value(app_id)
+                for app_id in app_ids
+            }
+        except requests.Timeout:
+            _logger.warning("%s-%s | Timed out reading Steam store page.", app_ids[0], app_ids[-1])
+        except requests.ConnectionError:
+            _logger.warning("%s-%s | Could not connect to Steam.", app_ids[0], app_ids[-1])
+        except requests.RequestException as e:
+            _logger.warning("%s-%s | An unknown error occoured with the request to Steam. %s",
+                app_ids[0], app_ids[-1], type(e).__name__)
+
+        # Anything other than a rate limit or server error means Steam didn't accept the request
+        if steam_response is not None and not steam_response:
+            if steam_response.status_code != 429 and steam_response.status_code < 500:
+                return None
+
+            _logger.warning("%s-%s | Error reading Steam store info for games.",
+                app_ids[0], app_ids[-1])
+            steam_response = None
+
+        if not steam_response:
+            # Wait a while before asking again, longer each time it fails, keeping the last values
+            return {
+                app_id: self._cache_manager.add_failure_to_steam_native_cache(app_id)
+                for app_id in app_ids
+            }
+
+        # Steam only supports some filters for multiple apps, for the others it returns null
+        try:
+            steam_api_json = steam_response.json()
+            native_apps = {
+                app_id: is_native_from_appdetails(steam_api_json[app_id]) for app_id in app_ids
+            }
+        except (ValueError, TypeError, KeyError):
+            return None
+
+        for app_id, is_native_game in native_apps.items():
+            self._cache_manager.add_to_steam_native_cache(app_id, is_native_game)
+
+        return native_apps
+
+
+    def native_many(self, app_ids: list, skip_cache: bool = None) -> dict:
+        '''Checks all of the given apps for Native Linux support,
+           asking Steam about as many at once as it will allow.\n
+           skip_cache defaults to the skip_cache option. Stops once the deadline has passed,
+           if there is one. Returns a dict of app ID to native support, for the apps which were
+           checked.'''
+
+        if skip_cache is None:
+            skip_cache = self._options["skip_cache"]
+
+        return self._native_many(app_ids, skip_cache)[0]
+
+
+    def _native_many(self, app_ids: list, skip_cache: bool, max_requests: int = None) -> tuple:
+        '''private: Same as native_many, stopping once max_requests requests have been made.\n
+           Returns a tuple of the dict of app ID to native support, and the number of requests
+           which were made.'''
+
+        native_apps = {}
+        apps_to_check = []
+
+        for app_id in app_ids:
+            if not skip_cache:
+                (found_in_cache, value) = self._cache_manager.get_from_steam_native_cache(app_id)
+                if found_in_cache:
+                    native_apps[app_id] = value
+                    continue
+
+            apps_to_check.append(app_id)
+
+        if not apps_to_check or self._options["offline"]:
+            return (native_apps, 0)
+
+        _logger.info("\nChecking %d games for native Linux support...", len(apps_to_check))
+        requests_made = 0
+        checked_count = 0
+        steam_host = urlparse(STEAM_STORE_URL).netloc
+
+        def can_request() -> bool:
+            return get_time_left(self._options["deadline"]) != 0 and \
+                (max_requests is None or requests_made < max_requests)
+
+        from Utils.HttpClient import DeadlineError # pylint: disable=import-outside-toplevel
+
+        # The apps which weren't checked before the deadline are left out
+        try:
+            for start in range(0, len(apps_to_check), STEAM_BATCH_SIZE):
+                if not can_request():
+                    break
+
+                batch = apps_to_check[start:start + STEAM_BATCH_SIZE]
+
+                if steam_host not in self._unbatched_hosts and len(batch) > 1:
+                    batch_result = self._is_native_batch(batch)
+                    requests_made += 1
+
+                    if batch_result is not None:
+                        native_apps.update(batch_result)
+                        checked_count += len(batch)
+                        continue
+
+                    # Don't bother trying again for the rest of the run
+                    _logger.info("Steam rejected checking multiple games at once, " \
+                        "checking them one at a time.")
+                    self._unbatched_hosts.add(steam_host)
+
+                for app_id in batch:
+                    if not can_request():
+                        break
+
+                    native_apps[app_id] = self._is_native(app_id, True)
+                    requests_made += 1
+                    checked_count += 1
+
+                self._cache_manager.save_caches() # Save every once in awhile
+        except DeadlineError:
+            pass
+
+        _logger.info("Checked %d of %d games for native Linux support with %d requests to Steam.",
+            checked_count, len(apps_to_check), requests_made)
+
+        return (native_apps, requests_made)
+
+
+    def owned_games(self, steam_id: str, get_api_key, hours: float = 24) -> list:
+        '''Gets the app IDs of the games on the Steam account from the Steam API.\n
+           The list is cached for the given number of hours, get_api_key is only called to get
+           the Steam API key if it needs to be fetched. Returns None if there is a problem with
+           the Steam API, and raises SteamAPIError if it doesn't accept the key or Steam ID.'''
+
+        if not self._options["skip_cache"]:
+            (found_in_cache, owned_games) = \
+                self._cache_manager.get_from_owned_games_cache(steam_id)
+            if found_in_cache:
+                return owned_games
+
+        if self._options["offline"]:
+            return None
+
+        import requests # pylint: disable=import-outside-toplevel
+
+        api_url = f"{STEAM_API_URL}/IPlayerService/GetOwnedGames/v0001/" + \
+            f"?key={get_api_key()}" + \
+            f"&steamid={steam_id}" + \
+            "&include_played_free_games=true" + \
+            "&skip_unvetted_apps=false" + \
+            "&include_free_sub=true" + \
+            "&format=json"
+
+        get_owned_games_result = None
+
+        try:
+            get_owned_games_result = self._http_client.get(api_url)
+        except requests.Timeout:
+            _logger.warning("Timed out reading apps list from Steam.")
+        except requests.ConnectionError:
+            _logger.warning("Could not connect to Steam.")
+        except requests.RequestException as e:
+            _logger.warning("An unknown error occoured with the request to Steam. %s",
+                type(e).__name__)
+
+        if not get_owned_games_result:
+            return None
+
+        if get_owned_games_result.status_code != 200:
+            _logger.warning("There was a problem retreiving your games list from the Steam API, " \
+                "status code was: %d", get_owned_games_result.status_code)
+
+            if get_owned_games_result.status_code == 401:
+                _logger.warning("A 401 status code usually means authentication failure, " \
+                    "your API key is most likely invalid.")
+            elif get_owned_games_result.status_code == 500:
+                _logger.warning("A 500 status code usually means server error, " \
+                    "your steamID64 may be invalid or Steam is currently down.")
+
+            raise SteamAPIError(f"Status code {get_owned_games_result.status_code}")
+
+        owned_games_json = get_owned_games_result.json()["response"]
+
+        if "games" not in owned_games_json:
+            _logger.warning("\nNo games returned by the Steam API for your account. " \
+                "This usually means that your profile and games list are set to private.")
+
+            _logger.warning("If you are uncomfortable having a public profile, don't worry. " \
+                "This only needs to be public for long enough to run the script.")
+
+            _logger.warning("\nThese settings can be changed here: " \
+                "https://steamcommunity.com/my/edit/settings")
+
+            return None
+
+        owned_games = [str(game["appid"]) for game in owned_games_json["games"]]
+        self._cache_manager.add_to_owned_games_cache(steam_id, owned_games, hours)
+
+        return owned_games
+
+
+    def _get_protondb_rating(self, app_id: str, skip_cache: bool,
+        revalidate: bool = False) -> str:
+        '''private: Gets the rating for the game from ProtonDB's API.
+           Defaults to 'unrated' if there is a problem with the ProtonDB API.\n
+           If revalidate is set ProtonDB is always asked, but only sends the rating if it
+           changed.'''
+
+        if not skip_cache and not revalidate:
+            (found_in_cache, value) = self._cache_manager.get_from_protondb_cache(app_id)
+            if found_in_cache:
+                return value
+
+        import requests # pylint: disable=import-outside-toplevel
+        from Utils.CircuitBreaker import CircuitOpenError # pylint: disable=import-outside-toplevel
+        from Utils.HttpClient import DeadlineError # pylint: disable=import-outside-toplevel
+
+        # For example, Warframe: https://www.protondb.com/api/v1/reports/summaries/230410.json
+        api_url = f"{PROTONDB_URL}/api/v1/reports/summaries/{app_id}.json"
+        protondb_response = None
+        protondb_ranking = "unrated"
+
+        # If the rating has been downloaded before, ProtonDB can tell us it hasn't changed
+        # instead of sending it again
+        validators = {} if skip_cache else self._cache_manager.get_protondb_validators(app_id)
+        headers = {}
+        if "etag" in validators:
+            headers["If-None-Match"] = validators["etag"]
+        if "last_modified" in validators:
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+        try:
+            protondb_response = self._http_client.get(api_url, headers=headers,
+                timeout=get_time_left(self._options["deadline"]))
+        except DeadlineError:
+            raise
+        except CircuitOpenError:
+            return self._cache_manager.get_last_protondb_value(app_id)
+        except requests.Timeout:
+            _logger.warning("%s | Timed out reading the ranking from ProtonDB", app_id)
+        except requests.ConnectionError:
+            _logger.warning("%s | Could not connect to ProtonDB.", app_id)
+        except requests.RequestException as e:
+            _logger.warning("%s | An unknown error occoured with the request to ProtonDB. %s",
+                app_id, type(e).__name__)
+
+        if protondb_response is not None and protondb_response.status_code == 304 and validators:
+            return self._cache_manager.extend_protondb_cache(app_id)
+
+        if protondb_response:
+            validators = {}
+            if protondb_response.status_code == 200:
+                protondb_data = protondb_response.json()
+                protondb_ranking = protondb_data["trendingTier"]
+
+                if "ETag" in protondb_response.headers:
+                    validators["etag"] = protondb_response.headers["ETag"]
+                if "Last-Modified" in protondb_response.headers:
+                    validators["last_modified"] = protondb_response.headers["Last-Modified"]
+
+            self._cache_manager.add_to_protondb_cache(app_id, protondb_ranking,
+                validators=validators)
+        elif protondb_response is not None and protondb_response.status_code == 404:
+            # ProtonDB doesn't have the game, it is less likely to be added the longer this goes on
+            protondb_ranking = self._cache_manager.add_failure_to_protondb_cache(app_id,
+                not_found=True)
+        else:
+            # Wait a while before asking again, longer each time it fails, keeping the last rating
+            protondb_ranking = self._cache_manager.add_failure_to_protondb_cache(app_id)
+
+        return protondb_ranking
+
+
+    def _get_game_rating(self, app_id: str, native_apps: dict = None) -> str:
+        '''private: Gets the rating to tag the game with, checking for native support first if
+           enabled.\n
+           native_apps can contain the already known native support for games.'''
+
+        # If the app is native, no need to check ProtonDB
+        if self._options["check_native"]:
+            if native_apps and app_id in native_apps:
+                native = native_apps[app_id]
+            else:
+                native = self._is_native(app_id, self._options["skip_cache"])
+
+            if native:
+                return "native"
+
+        # Get the ProtonDB rating for the app, if nothing returned defaults to unrated
+        return self._get_protondb_rating(app_id, self._options["skip_cache"])
+
+
+    def _get_offline_rating(self, app_id: str) -> str:
+        '''private: Gets the rating for the game without making any requests, from the caches
+           and the ProtonDB reports index if it is being used. Returns None if there is no data
+           for the game.'''
+
+        if self._options["check_native"]:
+            (found_in_cache, native) = self._cache_manager.get_from_steam_native_cache(app_id)
+            if found_in_cache and native:
+                return "native"
+
+        rating = self._reports_manager.get_rating(app_id) if self._reports_manager else None
+        if rating:
+            return rating
+
+        (found_in_cache, rating) = self._cache_manager.get_from_protondb_cache(app_id)
+        return rating if found_in_cache else None
+
+
+    def _get_offline_ratings(self, app_ids: list) -> dict:
+        '''private: Gets the ratings for the given apps without making any requests, see
+           _get_offline_rating.\n
+           Games without any data are left out, and listed at the end.'''
+
+        ratings = {}
+        missing_apps = []
+
+        for app_id in app_ids:
+            rating = self._get_offline_rating(app_id)
+            if rating is None:
+                missing_apps.append(app_id)
+            else:
+                ratings[app_id] = rating
+
+        for app_id in missing_apps:
+            _logger.info("%s | No cached rating, so it won't be tagged while offline.", app_id)
+
+        _logger.info("Found ratings for %d of %d games without going online.",
+            len(ratings), len(app_ids))
+
+        return ratings
+
+
+    def _get_reports_ratings(self, app_ids: list, native_apps: dict) -> dict:
+        '''private: Gets the ratings for the given apps from the ProtonDB reports index.\n
+           Native games and games which are not in the index are left out.'''
+
+        ratings = {}
+
+        for app_id in app_ids:
+            if native_apps.get(app_id):
+                continue
+
+            rating = self._reports_manager.get_rating(app_id)
+            if rating:
+                ratings[app_id] = rating
+
+        _logger.info("Found %d of %d games in the ProtonDB reports index.",
+            len(ratings), len(app_ids))
+
+        return ratings
+
+
+    def _get_game_ratings(self, app_ids: list, get_rating) -> dict:
+        '''private: Gets the ratings for all of the given apps at once, using up to the workers
+           option threads.\n
+           get_rating is called with each app ID from the worker threads to get its rating.
+           Stops once the deadline has passed, if there is one, the apps which haven't been
+           rated by then are left out. Returns a dict of app ID to rating.'''
+
+        from Utils.HttpClient import DeadlineError # pylint: disable=import-outside-toplevel
+
+        ratings = {}
+        app_count = len(app_ids)
+
+        with ThreadPoolExecutor(max_workers=max(self._options["workers"], 1)) as executor:
+            futures = {executor.submit(get_rating, app_id): app_id for app_id in app_ids}
+
+            try:
+                for count, future in enumerate(as_completed(futures,
+                    get_time_left(self._options["deadline"])), 1):
+                    try:
+                        ratings[futures[future]] = future.result()
+                    except DeadlineError:
+                        continue
+
+                    if count % 10 == 0:
+                        _logger.info("Fetched (%d of %d) ratings...", count, app_count)
+                        self._cache_manager.save_caches() # Save every once in awhile
+            except FutureTimeoutError:
+                pass
+
+            # Anything still waiting to start is cancelled, the running ones stop at the
+            # deadline as their requests are only given the time left.
+            # Python 3.9 can do this with executor.shutdown(cancel_futures=True).
+            for future in futures:
+                future.cancel()
+
+        return ratings
+
+
+    def rate(self, app_id: str) -> str:
+        '''Gets the rating to tag a single game with.\n
+           Offline, or once the deadline has passed, only the caches and the reports index are
+           used, and None is returned if there is no data for the game.'''
+
+        if self._options["offline"] or get_time_left(self._options["deadline"]) == 0:
+            return self._get_offline_rating(app_id)
+
+        from Utils.HttpClient import DeadlineError # pylint: disable=import-outside-toplevel
+
+        try:
+            return self._get_game_rating(app_id)
+        except DeadlineError:
+            return self._get_offline_rating(app_id)
+
+
+    def rate_many(self, app_ids: list, on_rating=None) -> dict:
+        '''Gets the ratings to tag all of the given games with.\n
+           Native support is checked for several games with each request, and the ProtonDB
+           ratings are fetched using up to the workers option threads. on_rating is called from
+           the worker threads with the app ID and rating each time a rating is fetched, and
+           returns the rating to use.\n
+           Returns a dict of app ID to rating, games without a rating are left out, such as games
+           with no cached data offline, or which weren't started before the deadline.'''
+
+        app_ids = [app_id for app_id in app_ids if is_valid_app_id(app_id)]
+
+        if self._options["offline"]:
+            # Nothing is fetched, games without any data are left out
+            return self._get_offline_ratings(app_ids)
+
+        ratings = {}
+        native_apps = {}
+        if self._options["check_native"]:
+            native_apps = self.native_many(app_ids)
+
+        # Ratings from the reports dump don't need any requests to ProtonDB
+        if self._reports_manager:
+            ratings.update(self._get_reports_ratings(app_ids, native_apps))
+
+        def fetch_rating(app_id: str) -> str:
+            rating = self._get_game_rating(app_id, native_apps)
+            return on_rating(app_id, rating) if on_rating else rating
+
+        if get_time_left(self._options["deadline"]) != 0:
+            ratings.update(self._get_game_ratings(
+                [app_id for app_id in app_ids if app_id not in ratings], fetch_rating))
+
+        return ratings
+
+
+    def prefetch_rating(self, app_id: str) -> str:
+        '''Gets the rating for a game found while its sharedconfig is still being read.\n
+           Returns None to leave the game to be rated later, if it isn't a valid app ID, the
+           deadline has passed, or its native support still needs checking, as that is done for
+           several games with each request.'''
+
+        if self._options["offline"] or not is_valid_app_id(app_id) \
+            or get_time_left(self._options["deadline"]) == 0:
+            return None
+
+        if self._options["check_native"]:
+            (found_in_cache, native) = (False, None)
+            # Left to be checked with the other games, where the miss is counted
+            if not self._options["skip_cache"]:
+                (found_in_cache, native) = self._cache_manager.get_from_steam_native_cache(app_id,
+                    count_miss=False)
+
+            if not found_in_cache:
+                return None
+            if native:
+                return "native"
+
+        return self._get_protondb_rating(app_id, self._options["skip_cache"])
+
+
+    def refresh_expiring(self, budget: int = None, window: float = None) -> None:
+        '''Fetches the cached values which expire soonest again before they are needed,
+           so that the requests are spread out evenly over daily runs instead of all expiring at
+           once.\n
+           Up to budget requests are made, for values which expire within window hours.'''
+
+        if self._options["offline"]:
+            return
+
+        expires_before = None
+        if window is not None:
+            expires_before = int(time.time() + (window * 3600))
+
+        # Native support is checked for several games with each request, if Steam allows it
+        native_cost = 1 / STEAM_BATCH_SIZE
+        if urlparse(STEAM_STORE_URL).netloc in self._unbatched_hosts:
+            native_cost = 1
+        limit = None if budget is None else int(budget / native_cost)
+
+        native_app_ids = []
+        protondb_app_ids = []
+        requests_needed = 0.0
+
+        for (_, cache, app_id) in self._cache_manager.get_expiring_entries(limit,
+            expires_before, self._options["check_native"]):
+            requests_needed += native_cost if cache == "steam_native" else 1
+            if budget is not None and requests_needed > budget:
+                break
+
+            if cache == "steam_native":
+                native_app_ids.append(app_id)
+            else:
+                protondb_app_ids.append(app_id)
+
+        if not native_app_ids and not protondb_app_ids:
+            return
+
+        _logger.info("\nRefreshing %d ProtonDB ratings and %d native checks which expire " \
+            "soonest...", len(protondb_app_ids), len(native_app_ids))
+
+        from Utils.HttpClient import DeadlineError # pylint: disable=import-outside-toplevel
+
+        # Checking the games one at a time if Steam rejects batches mustn't go over the budget
+        if native_app_ids:
+            max_requests = None if budget is None else budget - len(protondb_app_ids)
+            (_, native_requests) = self._native_many(native_app_ids, True, max_requests)
+
+            if budget is not None:
+                protondb_app_ids = protondb_app_ids[:max(budget - native_requests, 0)]
+
+        with ThreadPoolExecutor(max_workers=max(self._options["workers"], 1)) as executor:
+            futures = [
+                executor.submit(self._get_protondb_rating, app_id, False, True)
+                for app_id in protondb_app_ids
+            ]
+
+            for count, future in enumerate(as_completed(futures), 1):
+                try:
+                    future.result()
+                except DeadlineError:
+                    continue
+
+                if count % 10 == 0:
+                    self._cache_manager.save_caches() # Save every once in awhile
+
+        self._cache_manager.save_caches()
+
+
+    def apply_tags(self, sharedconfig: dict, app_ids: list = None, ratings: dict = None) \
+        -> tuple: # [list, dict]
+        '''Tags the games in the sharedconfig with their ratings, changing only the tags which
+           need to.\n
+           app_ids can be given to only tag some of the games, and ratings can contain the
+           already known ratings for games, the rest are rated together with rate_many first.
+           The sharedconfig isn't saved. Returns the change-set and a dict of app ID to rating,
+           see plan_tags.'''
+
+        apps = get_apps_list(sharedconfig)
+        if app_ids is None:
+            app_ids = list(apps)
+
+        ratings = dict(ratings or {})
+        missing_apps = [app_id for app_id in app_ids
+            if app_id not in ratings and is_valid_app_id(app_id)]
+        if missing_apps and not self._options["offline"] \
+            and get_time_left(self._options["deadline"]) != 0:
+            ratings.update(self.rate_many(missing_apps))
+
+        # Offline, or once the deadline has passed, any cached value is used for the rest
+        def get_rating(app_id: str) -> str:
+            return ratings[app_id] if app_id in ratings else self._get_offline_rating(app_id)
+
+        (changes, tagged_apps) = plan_tags(apps, app_ids, get_rating, self._cache_manager)
+
+        # Nothing to change, so nothing else needs to look at the apps
+        if changes:
+            apply_tags(apps, changes)
+
+        return (changes, tagged_apps)
+
+
+    def _get_expired_apps(self, apps: dict) -> list:
+        '''private: Gets the games whose cached ratings have expired.'''
+
+        now = int(time.time())
+        expired_apps = []
+
+        for app_id in apps:
+            if is_valid_app_id(app_id):
+                time_to_check = self._cache_manager.get_time_to_check(app_id,
+                    self._options["check_native"])
+                if time_to_check is not None and time_to_check <= now:
+                    expired_apps.append(app_id)
+
+        return expired_apps
+
+
+    def watch(self, sharedconfigs: list, watch_interval: float, refresh_interval: float,
+        write: bool = True) -> None:
+        '''Keeps running until interrupted, tagging any games which are added to the
+           sharedconfigs, and updating the tags for games whose cached ratings expire.\n
+           sharedconfigs is a list of (path, sharedconfig), the files are checked for changes
+           every watch_interval seconds and the expired ratings every refresh_interval seconds.
+           The sharedconfigs which change are written if write is set. The deadline is removed,
+           and expired values are only used offline.'''
+
+        self.set_deadline(None)
+        self._cache_manager.set_stale_ok(self._options["offline"])
+
+        # Each watched sharedconfig is [path, sharedconfig, apps, file state]
+        watched = [[path, sharedconfig, get_apps_list(sharedconfig), get_file_state(path)]
+            for (path, sharedconfig) in sharedconfigs]
+        next_refresh = time.time() + refresh_interval
+
+        while True:
+            time.sleep(watch_interval)
+
+            for watched_sharedconfig in watched:
+                (sharedconfig_path, sharedconfig, apps, file_state) = watched_sharedconfig
+                apps_to_tag = []
+
+                if get_file_state(sharedconfig_path) not in (file_state, None):
+                    # Steam may still be writing it, wait until it has finished
+                    while get_file_state(sharedconfig_path) != file_state:
+                        file_state = get_file_state(sharedconfig_path)
+                        time.sleep(1)
+
+                    # The file state isn't updated, so it is read again next time
+                    try:
+                        sharedconfig = self.load_sharedconfig(sharedconfig_path)
+                    except (OSError, ValueError) as e:
+                        _logger.warning("Error reading %s, trying again later. %s",
+                            sharedconfig_path, e)
+                        continue
+
+                    new_apps = get_apps_list(sharedconfig)
+
+                    # Only the games which weren't there before need to be tagged
+                    apps_to_tag = [app_id for app_id in new_apps if app_id not in apps]
+                    (apps, watched_sharedconfig[1:]) = \
+                        (new_apps, [sharedconfig, new_apps, file_state])
+
+                    _logger.info("%s changed, found %d new games.", sharedconfig_path,
+                        len(apps_to_tag))
+
+                if time.time() >= next_refresh:
+                    # Re-checking the games with expired ratings updates their cached values
+                    apps_to_tag += [app_id for app_id in self._get_expired_apps(apps)
+                        if app_id not in apps_to_tag]
+
+                if apps_to_tag:
+                    (changes, _) = self.apply_tags(sharedconfig, apps_to_tag)
+                    self._cache_manager.save_caches()
+
+                    if changes and write:
+                        self.write_sharedconfig(sharedconfig_path, sharedconfig)
+                        watched_sharedconfig[3] = get_file_state(sharedconfig_path)
+
+            if time.time() >= next_refresh:
+                next_refresh = time.time() + refresh_interval
+
+
+    def close(self) -> None:
+        '''Saves the caches, along with the snapshot of them used to start up faster.'''
+
+        self._cache_manager.save_caches()
+        self._cache_manager.save_index()
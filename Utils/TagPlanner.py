@@ -0,0 +1,180 @@
+'''Tag Planner'''
+
+import json
+import logging
+
+from Utils.CacheManager import CacheManager
+
+_logger = logging.getLogger(__name__)
+
+# The numbers force the better ranks to be at the top, as Steam sorts these alphanumerically
+POSSIBLE_RANKS = {
+    "native":   "ProtonDB Ranking: 0 Native",
+    "platinum": "ProtonDB Ranking: 1 Platinum",
+    "gold":     "ProtonDB Ranking: 2 Gold",
+    "silver":   "ProtonDB Ranking: 3 Silver",
+    "bronze":   "ProtonDB Ranking: 4 Bronze",
+    "pending":  "ProtonDB Ranking: 5 Pending",
+    "unrated":  "ProtonDB Ranking: 6 Unrated",
+    "borked":   "ProtonDB Ranking: 7 Borked",
+}
+
+# Used to find the tier of an existing tag without searching through POSSIBLE_RANKS
+RANK_TIERS = {rank: tier for tier, rank in POSSIBLE_RANKS.items()}
+RANK_PREFIX = "ProtonDB Ranking:"
+
+# The orders the games can be tagged in, see order_apps
+APP_ORDERS = ["recent", "cached", "sharedconfig"]
+
+
+def is_valid_app_id(app_id: str) -> bool:
+    '''Some Steam AppID's are strings of text, which ProtonDB does not support.
+       Check test01.vdf line 278 for an example.'''
+
+    try:
+        int(app_id)
+    except ValueError:
+        return False
+
+    return True
+
+
+def get_last_played(app: dict) -> int:
+    '''Gets when the game was last played from its sharedconfig entry,
+       as a Unix timestamp. 0 if it hasn't been played.'''
+
+    if not isinstance(app, dict):
+        return 0
+
+    try:
+        return int(app.get("LastPlayed", 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+def order_apps(app_ids: list, last_played: dict, order: str, is_cached=None) -> list:
+    '''Sorts the app IDs into the order they should be tagged in,
+       so the most relevant games are tagged first if the run is stopped early.\n
+       "recent" puts the most recently played games first, "cached" puts the games which already
+       have a cached rating first and then the most recently played, and "sharedconfig" keeps the
+       order they are in the sharedconfig. last_played is a dict of app ID to get_last_played,
+       and is_cached is called with each app ID for "cached".'''
+
+    if order == "sharedconfig":
+        return list(app_ids)
+
+    # Sorting is stable, so games played at the same time stay in the sharedconfig order
+    if order == "cached":
+        return sorted(app_ids,
+            key=lambda app_id: (not is_cached(app_id), -last_played.get(app_id, 0)))
+
+    return sorted(app_ids, key=lambda app_id: -last_played.get(app_id, 0))
+
+
+def get_tag_slot(app: dict) -> tuple: # [str, str, list]
+    '''Finds the tag number for the ProtonDB rating of the game, the tier of the tag already there,
+       and the tag numbers of any duplicate ProtonDB rating tags.\n
+       If the game doesn't have a rating tag the next available tag number is used.
+       The tier is None if there is no tag at that number, or "" if it isn't a known rating.'''
+
+    tags = app.get("tags")
+
+    # If the tags key wasn't found, that means there are no tags for the game
+    if not isinstance(tags, dict):
+        return ("0", None, [])
+
+    tag_num = None
+    duplicates = []
+
+    for tag, value in tags.items():
+        # Search to see if a ProtonDB rank is already a tag, if so just overwrite that tag
+        if value.startswith(RANK_PREFIX):
+            if tag_num is None:
+                tag_num = tag
+            else:
+                # Dupe tags caused by error of previous versions,
+                # may remove this check in the future once its no longer an issue
+                duplicates.append(tag)
+
+    if tag_num is None:
+        # If no ProtonDB tags were found, use the next available number
+        tag_num = str(len(tags))
+
+    if tag_num not in tags:
+        return (tag_num, None, duplicates)
+
+    return (tag_num, RANK_TIERS.get(tags[tag_num], ""), duplicates)
+
+
+def plan_tags(apps: dict, apps_to_tag: list, get_rating, cache_manager: CacheManager) -> tuple:
+    '''Works out which tags need to change for each of apps_to_tag, without changing apps.\n
+       get_rating is called with each app ID to get its rating, games it returns None for are
+       left as they are. Returns the change-set and a dict of app ID to rating. Each change is
+       (app ID, tag number, old tier, new tier, tag numbers of duplicates to remove).'''
+
+    app_count = len(apps_to_tag)
+    changes = []
+    ratings = {}
+
+    for count, app_id in enumerate(apps_to_tag, 1):
+        if not is_valid_app_id(app_id):
+            continue
+
+        game_rating = get_rating(app_id)
+        if game_rating is None:
+            continue
+
+        ratings[app_id] = game_rating
+
+        (tag_num, old_tier, duplicates) = get_tag_slot(apps[app_id])
+        stale_note = " (stale)" if cache_manager.is_stale(app_id) else ""
+
+        # If the returned rating from ProtonDB isn't a known rank it can't be tagged
+        if game_rating not in POSSIBLE_RANKS:
+            _logger.warning("Unknown ProtonDB rating: %s\n Please report this on GitHub!",
+                game_rating)
+
+        # No change since last run, we don't need to output or save it
+        elif old_tier != game_rating or duplicates:
+            if old_tier is None:
+                _logger.info("%s | %s%s (%d of %d)", app_id, game_rating, stale_note,
+                    count, app_count)
+            elif old_tier != game_rating:
+                _logger.info("%s | %s => %s%s (%d of %d)", app_id, old_tier, game_rating,
+                    stale_note, count, app_count)
+
+            changes.append((app_id, tag_num, old_tier, game_rating, duplicates))
+
+        if count > 0 and count % 10 == 0:
+            _logger.info("Processed (%d of %d) games...", count, app_count)
+            cache_manager.save_caches() # Save every once in awhile
+
+    return (changes, ratings)
+
+
+def apply_tags(apps: dict, changes: list) -> None:
+    '''Changes the tags in apps to match the change-set from plan_tags.'''
+
+    for (app_id, tag_num, _, new_tier, duplicates) in changes:
+        app = apps[app_id]
+        if not isinstance(app.get("tags"), dict):
+            app["tags"] = {}
+
+        for duplicate in duplicates:
+            del app["tags"][duplicate]
+
+        app["tags"][tag_num] = POSSIBLE_RANKS[new_tier]
+
+
+def export_changes(path: str, change_sets: dict) -> None:
+    '''Writes the change-set for each sharedconfig to a JSON file.'''
+
+    with open(path, mode="w", encoding="utf-8") as changes_file:
+        json.dump({
+            sharedconfig_path: [
+                {"app_id": app_id, "tag": tag_num, "old": old_tier, "new": new_tier,
+                    "remove": duplicates}
+                for (app_id, tag_num, old_tier, new_tier, duplicates) in changes
+            ]
+            for sharedconfig_path, changes in change_sets.items()
+        }, changes_file, indent=2)
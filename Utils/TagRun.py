@@ -0,0 +1,319 @@
+'''Tag Run'''
+
+import logging
+import time
+
+from Utils.CheckpointManager import CheckpointManager
+from Utils.ManifestManager import ManifestManager
+from Utils.MetricsManager import MetricsManager
+from Utils.Prefetcher import Prefetcher
+from Utils.SharedconfigManager import get_apps_list
+from Utils.TagEngine import TagEngine, get_time_left
+from Utils.TagPlanner import get_last_played, is_valid_app_id, order_apps
+
+_logger = logging.getLogger(__name__)
+
+# Options for TagRun, these match the command line options of the same names
+DEFAULT_RUN_OPTIONS = {
+    "order": "recent",
+    "incremental": False,
+    "resume": False,
+    "refresh_budget": None,
+    "refresh_window": None,
+}
+
+
+class TagRun: # pylint: disable=too-many-instance-attributes
+    '''Tag Run, tags all of the games in one or more sharedconfigs in a single run.\n
+       The most relevant games are done first, with the incremental option only the games which
+       changed since the last run are looked at, and the progress is kept in a checkpoint so an
+       interrupted run can be resumed. Saving the sharedconfigs is left to the caller, as Steam
+       may need to be asked to import them.'''
+
+    def __init__(self, tag_engine: TagEngine, options: dict = None,
+        metrics_manager: MetricsManager = None):
+        '''Init, options can contain any of DEFAULT_RUN_OPTIONS to change them.\n
+           The phases of the run are timed with the metrics manager if one is given.
+           Raises ValueError for unknown options.'''
+
+        unknown_options = set(options or {}) - set(DEFAULT_RUN_OPTIONS)
+        if unknown_options:
+            raise ValueError(f"Unknown options: {', '.join(sorted(unknown_options))}")
+
+        self._options = dict(DEFAULT_RUN_OPTIONS)
+        self._options.update(options or {})
+
+        self._tag_engine = tag_engine
+        self._metrics_manager = metrics_manager or MetricsManager()
+
+        # Each sharedconfig is [path, sharedconfig, apps, apps to tag, manifest]
+        self._sharedconfigs = []
+        self._prefetched_ratings = {}
+        self._checkpoint_manager = None
+        self._app_count = 0
+        self._tagged_count = 0
+
+
+    def _get_run_options(self) -> dict:
+        '''private: Gets the options which have to match for a checkpoint or manifest to be used.'''
+
+        return {option: self._tag_engine.get_option(option)
+            for option in ("check_native", "use_reports")}
+
+
+    def _read_sharedconfig(self, sharedconfig_path: str, on_app) -> tuple: # [str, dict]
+        '''private: Reads a sharedconfig with the tag engine, for load_sharedconfigs.'''
+
+        return (sharedconfig_path, self._tag_engine.load_sharedconfig(sharedconfig_path, on_app))
+
+
+    def load_sharedconfigs(self, sharedconfig_paths: list, read_sharedconfig=None) -> list:
+        '''Reads the sharedconfigs to tag.\n
+           read_sharedconfig is called with each path and a function to call with each app ID
+           as it is read, and returns the path and sharedconfig. It defaults to reading the path
+           with TagEngine.load_sharedconfig. Returns a list of (path, sharedconfig).'''
+
+        read_sharedconfig = read_sharedconfig or self._read_sharedconfig
+
+        with self._metrics_manager.phase("config_load"):
+            # Ratings start being fetched as soon as each app is read, while the rest of the
+            # sharedconfigs are still being parsed. This is left out when only some of the games
+            # are going to be looked up, the ratings come from somewhere else, or the games need
+            # to be fetched in a different order to the file before the deadline.
+            prefetcher = None
+            if not (self._tag_engine.get_option("offline") \
+                or self._tag_engine.get_option("use_reports") \
+                or self._options["incremental"] or self._options["resume"] \
+                or (self._tag_engine.get_option("deadline") is not None \
+                    and self._options["order"] != "sharedconfig")):
+                prefetcher = Prefetcher(self._tag_engine.prefetch_rating,
+                    self._tag_engine.get_option("workers"))
+
+            for sharedconfig_path in sharedconfig_paths:
+                self._sharedconfigs.append(list(read_sharedconfig(sharedconfig_path,
+                    prefetcher.add if prefetcher else None)))
+
+            # Anything the prefetcher didn't get to is fetched with the rest of the games
+            (self._prefetched_ratings, prefetch_leftovers) = \
+                prefetcher.stop() if prefetcher else ({}, [])
+            self._metrics_manager.set_count("prefetched", len(self._prefetched_ratings))
+            self._metrics_manager.set_count("prefetch_leftovers", len(prefetch_leftovers))
+
+        return self.get_sharedconfigs()
+
+
+    def get_sharedconfigs(self) -> list:
+        '''Gets the sharedconfigs which were read, as a list of (path, sharedconfig).'''
+
+        return [tuple(user_sharedconfig[:2]) for user_sharedconfig in self._sharedconfigs]
+
+
+    def get_apps_to_tag(self, sharedconfig_path: str) -> list:
+        '''Gets the app IDs which tag looked at in one of the sharedconfigs, in the order they
+           were tagged.'''
+
+        for (path, _, _, apps_to_tag, _) in self._sharedconfigs:
+            if path == sharedconfig_path:
+                return apps_to_tag
+
+        return []
+
+
+    def get_app_count(self) -> int:
+        '''Gets the number of games which tag looked at, after leaving out the unchanged games
+           with the incremental option.'''
+
+        return self._app_count
+
+
+    def get_untagged_count(self) -> int:
+        '''Gets the number of games which weren't tagged because the deadline passed,
+           these are checked on the next run.'''
+
+        if get_time_left(self._tag_engine.get_option("deadline")) != 0:
+            return 0
+
+        return sum(len([app_id for app_id in apps_to_tag if is_valid_app_id(app_id)])
+            for (_, _, _, apps_to_tag, _) in self._sharedconfigs) - self._tagged_count
+
+
+    def _get_incremental_apps(self) -> list:
+        '''private: Works out which games are new, or whose rating has expired, since the last
+           run of each sharedconfig. Returns the app IDs to look at.'''
+
+        cache_path = self._tag_engine.get_cache_manager().get_base_cache_path()
+
+        for user_sharedconfig in self._sharedconfigs:
+            manifest_manager = ManifestManager(cache_path, user_sharedconfig[0],
+                self._get_run_options())
+            (apps_to_tag, removed_apps) = manifest_manager.get_changes(
+                [app_id for app_id in user_sharedconfig[2] if is_valid_app_id(app_id)])
+            manifest_manager.remove_apps(removed_apps)
+            user_sharedconfig[3:] = [apps_to_tag, manifest_manager]
+
+            _logger.info("%d new or expired games, %d removed games since the last run of %s.",
+                len(apps_to_tag), len(removed_apps), user_sharedconfig[0])
+
+            if removed_apps and not apps_to_tag:
+                manifest_manager.save_manifest()
+
+        return list(dict.fromkeys(app_id for (_, _, _, apps_to_tag, _) in self._sharedconfigs
+            for app_id in apps_to_tag))
+
+
+    def _order_apps(self, app_ids: list) -> list:
+        '''private: Orders the games so the most relevant are done first, in case the run is
+           stopped by the deadline. Returns the ordered app IDs.'''
+
+        cache_manager = self._tag_engine.get_cache_manager()
+        check_native = self._tag_engine.get_option("check_native")
+
+        last_played = {}
+        for (_, _, apps, _, _) in self._sharedconfigs:
+            for app_id, app in apps.items():
+                last_played[app_id] = max(last_played.get(app_id, 0), get_last_played(app))
+
+        now = int(time.time())
+        def is_cached(app_id: str) -> bool:
+            return (cache_manager.get_time_to_check(app_id, check_native) or 0) > now
+
+        for user_sharedconfig in self._sharedconfigs:
+            user_sharedconfig[3] = order_apps(user_sharedconfig[3], last_played,
+                self._options["order"], is_cached)
+
+        return order_apps(app_ids, last_played, self._options["order"], is_cached)
+
+
+    def tag(self, owned_games: list = None) -> dict:
+        '''Tags the games in the sharedconfigs from load_sharedconfigs, along with any games from
+           owned_games which aren't in them yet.\n
+           Returns a dict of path to the change-set for each sharedconfig, see plan_tags.
+           The sharedconfigs aren't saved, finish should be called once they have been.'''
+
+        cache_manager = self._tag_engine.get_cache_manager()
+        check_native = self._tag_engine.get_option("check_native")
+        self._tagged_count = 0
+
+        with self._metrics_manager.phase("app_list"):
+            for user_sharedconfig in self._sharedconfigs:
+                apps = get_apps_list(user_sharedconfig[1], owned_games)
+                user_sharedconfig[2:] = [apps, list(apps), None]
+
+            # Each game only needs to be looked up once, even if more than one user has it
+            all_apps = list(dict.fromkeys(app_id for (_, _, apps, _, _) in self._sharedconfigs
+                for app_id in apps))
+            app_ids = [app_id for app_id in all_apps if is_valid_app_id(app_id)]
+            self._app_count = len(all_apps)
+
+        _logger.info("\nFound a total of %d Steam games.", self._app_count)
+        self._metrics_manager.set_count("found", self._app_count)
+
+        change_sets = {sharedconfig_path: [] for (sharedconfig_path, *_) in self._sharedconfigs}
+        if self._app_count == 0:
+            return change_sets
+
+        # Done first, so the games which are tagged next use the refreshed values
+        if self._options["refresh_budget"] is not None \
+            or self._options["refresh_window"] is not None:
+            with self._metrics_manager.phase("refresh"):
+                self._tag_engine.refresh_expiring(self._options["refresh_budget"],
+                    self._options["refresh_window"])
+
+        # Only the games which are new, or whose rating has expired, need to be looked at
+        if self._options["incremental"]:
+            with self._metrics_manager.phase("app_list"):
+                app_ids = self._get_incremental_apps()
+                self._app_count = len(app_ids)
+
+            if self._app_count == 0:
+                _logger.info("Nothing has changed since the last run, so there is nothing to save.")
+                return change_sets
+
+        with self._metrics_manager.phase("app_list"):
+            app_ids = self._order_apps(app_ids)
+
+        self._metrics_manager.set_count("to_tag", self._app_count)
+
+        # Everything worked out from here is recorded, so an interrupted run can be resumed
+        self._checkpoint_manager = CheckpointManager(cache_manager.get_base_cache_path(),
+            [sharedconfig_path for (sharedconfig_path, *_) in self._sharedconfigs],
+            self._get_run_options(), self._options["resume"])
+
+        ratings = self._checkpoint_manager.get_ratings()
+        for app_id, rating in self._prefetched_ratings.items():
+            ratings[app_id] = self._checkpoint_manager.set_rating(app_id, rating)
+        ratings = {app_id: ratings[app_id] for app_id in app_ids if app_id in ratings}
+
+        # All of the ratings are fetched up front, the tags are then updated in the same order as
+        # they would be otherwise
+        with self._metrics_manager.phase("fetch"):
+            ratings.update(self._tag_engine.rate_many([app_id for app_id in app_ids
+                if app_id not in ratings], self._checkpoint_manager.set_rating))
+
+            if self._tag_engine.get_option("offline"):
+                self._metrics_manager.set_count("no_data", len(app_ids) - len(ratings))
+
+        with self._metrics_manager.phase("tag"):
+            for (sharedconfig_path, sharedconfig, _, apps_to_tag, manifest_manager) \
+                in self._sharedconfigs:
+                if len(self._sharedconfigs) > 1:
+                    _logger.info("\nTagging games for %s", sharedconfig_path)
+
+                (changes, tagged_apps) = self._tag_engine.apply_tags(sharedconfig, apps_to_tag,
+                    ratings)
+                change_sets[sharedconfig_path] = changes
+                self._checkpoint_manager.set_changes(sharedconfig_path, changes)
+                self._tagged_count += len(tagged_apps)
+
+                if manifest_manager:
+                    for app_id, game_rating in tagged_apps.items():
+                        # Reports index ratings don't expire, so check them again with the cache
+                        time_to_check = cache_manager.get_time_to_check(app_id, check_native) \
+                            or int(time.time()) + (86400 * 7)
+                        manifest_manager.set_rating(app_id, game_rating, time_to_check)
+
+        self._metrics_manager.set_count("tagged", self._tagged_count)
+        self._metrics_manager.set_count("changed",
+            sum(len(changes) for changes in change_sets.values()))
+
+        with self._metrics_manager.phase("cache_save"):
+            cache_manager.save_caches()
+
+        return change_sets
+
+
+    def save_progress(self) -> None:
+        '''Saves the checkpoint and caches, so the run can be resumed if it is interrupted.'''
+
+        if self._checkpoint_manager:
+            self._checkpoint_manager.save_checkpoint()
+        self._tag_engine.get_cache_manager().save_caches()
+
+
+    def finish(self, saved_paths: list) -> None:
+        '''Finishes the run once the sharedconfigs have been saved, saved_paths are the ones whose
+           tags were saved or didn't need to be.\n
+           Only the games in those are remembered for the incremental option, otherwise the next
+           run needs to do them again. Expired values which were used for the tags are recorded so
+           the next run fetches them, and the checkpoint is removed as there is nothing left to
+           resume.'''
+
+        cache_manager = self._tag_engine.get_cache_manager()
+
+        for (sharedconfig_path, _, _, _, manifest_manager) in self._sharedconfigs:
+            if manifest_manager and sharedconfig_path in saved_paths:
+                manifest_manager.save_manifest()
+
+        # Fetched on the next run instead of now, so that exiting isn't held up by them
+        stale_apps = cache_manager.get_stale_apps()
+        if stale_apps and not self._tag_engine.get_option("offline"):
+            _logger.info("\n%d games were tagged using expired cached data, they will be "
+                "refreshed on the next run.", len(stale_apps))
+        cache_manager.save_stale_apps()
+
+        # Snapshot of the caches so the next run can look values up without reading the database
+        with self._metrics_manager.phase("cache_index"):
+            self._tag_engine.close()
+
+        if self._checkpoint_manager:
+            self._checkpoint_manager.remove_checkpoint()
@@ -0,0 +1,300 @@
+'''VDF Patcher'''
+
+import os
+import re
+import shutil
+import tempfile
+
+import vdf
+
+# Same as the pattern used by vdf.parse, so both read the files the same way
+_RE_KEYVALUE = re.compile(r'^("(?P<qkey>(?:\\.|[^\\"])*)"|(?P<key>#?[a-z0-9\-\_\\\?$%<>]+))'
+                          r'([ \t]*('
+                          r'"(?P<qval>(?:\\.|[^\\"])*)(?P<vq_end>")?'
+                          r'|(?P<val>(?:(?<!/)/(?!/)|[a-z0-9\-\_\\\?\*\.$<> ])+)'
+                          r'|(?P<sblock>{[ \t]*)(?P<eblock>})?'
+                          r'))?',
+                          flags=re.I)
+
+_UNESCAPE_CHARS = {
+    r"\n": "\n", r"\t": "\t", r"\v": "\v", r"\b": "\b", r"\r": "\r", r"\f": "\f",
+    r"\a": "\a", r"\\": "\\", r"\?": "?", r"\"": "\"", r"\'": "\'",
+}
+_ESCAPE_CHARS = {value: key for key, value in _UNESCAPE_CHARS.items()}
+
+
+def _unescape(text: str) -> str:
+    '''private: Same as the unescaping done by vdf.parse.'''
+
+    return re.sub(r"(\\n|\\t|\\v|\\b|\\r|\\f|\\a|\\\\|\\\?|\\\"|\\')",
+        lambda match: _UNESCAPE_CHARS[match.group()], text)
+
+
+def _escape(text: str) -> str:
+    '''private: Same as the escaping done by vdf.dump.'''
+
+    return re.sub(r"[\n\t\v\b\r\f\a\\\?\"']", lambda match: _ESCAPE_CHARS[match.group()], text)
+
+
+class _Value: # pylint: disable=too-few-public-methods
+    '''private: Where a key and string value were found in the file.'''
+
+    __slots__ = ("value", "indent", "start", "end", "value_start", "value_end")
+
+    def __init__(self, value: str, indent: str, start: int, end: int, value_span: tuple):
+        self.value = value
+        self.indent = indent
+        self.start = start
+        self.end = end
+        (self.value_start, self.value_end) = value_span
+
+
+class _Block: # pylint: disable=too-few-public-methods
+    '''private: Where a key and block of values were found in the file.\n
+       close_start is None if the block was opened and closed on the same line.'''
+
+    __slots__ = ("children", "indent", "start", "end", "close_start", "duplicates")
+
+    def __init__(self, indent: str, start: int):
+        self.children = {}
+        self.indent = indent
+        self.start = start
+        self.end = start
+        self.close_start = None
+        self.duplicates = False
+
+
+class VdfLayout: # pylint: disable=too-few-public-methods
+    '''Where each key and value were found when parsing a VDF file,
+       used to write changes back without re-writing the rest of the file.'''
+
+    def __init__(self, text: str, root: _Block, separator: str):
+        self.text = text
+        self.root = root
+        self.separator = separator
+        self.newline = "\r\n" if "\r\n" in text[:text.find("\n") + 1] else "\n"
+
+
+def _iter_lines(text: str):
+    '''private: Yields the start position and contents of each line, including the newline.'''
+
+    position = 0
+    while position < len(text):
+        end = text.find("\n", position)
+        end = len(text) if end < 0 else end + 1
+        yield (position, text[position:end])
+        position = end
+
+
+def parse_vdf(text: str, watch_path: list = None, on_key=None) -> tuple: # [dict, VdfLayout]
+    '''Parses the VDF text the same way as vdf.loads, along with the layout of the file.\n
+       Optionally on_key is called with each key found directly inside the block at watch_path,
+       as soon as it is read, so it can be used before the rest of the file has been parsed.
+       watch_path is a list of the possible keys for each block on the way to it.\n
+       Raises SyntaxError if the text is not valid.'''
+
+    lines = _iter_lines(text)
+    root = _Block("", 0)
+    root.close_start = root.end = len(text)
+
+    # Each block is kept with how many levels of watch_path lead to it, -1 if it isn't on the path
+    watch_path = watch_path or []
+    watch_depth = len(watch_path) if on_key else None
+    stack = [({}, root, 0)]
+    expect_bracket = False
+    separator = None
+
+    for line_number, (line_start, line) in enumerate(lines, 1):
+        line_length = len(line)
+        if line_number == 1:
+            line = vdf.strip_bom(line)
+
+        line = line.lstrip()
+        offset = line_start + line_length - len(line)
+        line_end = line_start + line_length
+
+        # skip empty and comment lines
+        if line == "" or line[0] == "/":
+            continue
+
+        # one level deeper
+        if line[0] == "{":
+            expect_bracket = False
+            continue
+
+        if expect_bracket:
+            raise SyntaxError(f"Expected opening bracket on line {line_number}")
+
+        # one level back
+        if line[0] == "}":
+            if len(stack) == 1:
+                raise SyntaxError(f"Too many closing brackets on line {line_number}")
+
+            (_, block, _) = stack.pop()
+            block.close_start = line_start
+            block.end = line_end
+            continue
+
+        (parent_dict, parent_block, parent_depth) = stack[-1]
+        indent = text[line_start:offset]
+
+        while True:
+            match = _RE_KEYVALUE.match(line)
+
+            # Keep reading until the key, or the value in quotes, has been closed
+            if not match or (match.group("qval") is not None and match.group("vq_end") is None):
+                try:
+                    (next_line_start, next_line) = next(lines)
+                except StopIteration as e:
+                    raise SyntaxError(f"Unexpected end of file on line {line_number}") from e
+
+                line += next_line
+                line_end = next_line_start + len(next_line)
+                continue
+
+            break
+
+        key = _unescape(match.group("key") if match.group("qkey") is None else match.group("qkey"))
+        if parent_depth == watch_depth:
+            on_key(key)
+
+        value = match.group("qval")
+        value_span = (offset + match.start("qval") - 1, offset + match.end("qval") + 1)
+
+        if value is None:
+            value = match.group("val")
+            if value is not None:
+                value = value.rstrip()
+                value_span = (offset + match.start("val"), offset + match.start("val") + len(value))
+                if value == "":
+                    value = None
+
+        if key in parent_block.children:
+            parent_block.duplicates = True
+
+        if value is None:
+            # Blocks with the same key are merged together
+            child_dict = parent_dict.get(key)
+            if not isinstance(child_dict, dict):
+                child_dict = parent_dict[key] = {}
+
+            block = parent_block.children[key] = _Block(indent, line_start)
+
+            if match.group("eblock") is None:
+                depth = -1
+                if 0 <= parent_depth < len(watch_path) and key in watch_path[parent_depth]:
+                    depth = parent_depth + 1
+
+                stack.append((child_dict, block, depth))
+                if match.group("sblock") is None:
+                    expect_bracket = True
+            else:
+                block.end = line_end
+        else:
+            if separator is None:
+                separator = text[offset + match.end(1):value_span[0]]
+
+            parent_dict[key] = _unescape(value)
+            parent_block.children[key] = \
+                _Value(parent_dict[key], indent, line_start, line_end, value_span)
+
+    if len(stack) != 1:
+        raise SyntaxError("Unclosed brackets or quotes at the end of the file")
+
+    return (stack[0][0], VdfLayout(text, root, separator or "\t\t"))
+
+
+def _format(key: str, value, indent: str, layout: VdfLayout) -> str:
+    '''private: Formats a key and value the same way as vdf.dump with pretty=True,
+       using the separator and newlines from the original file.'''
+
+    if not isinstance(value, dict):
+        return f'{indent}"{_escape(key)}"{layout.separator}"{_escape(str(value))}"{layout.newline}'
+
+    lines = [f'{indent}"{_escape(key)}"{layout.newline}{indent}{{{layout.newline}']
+    for child_key, child_value in value.items():
+        lines.append(_format(child_key, child_value, indent + "\t", layout))
+    lines.append(f"{indent}}}{layout.newline}")
+
+    return "".join(lines)
+
+
+def _diff_block(block: _Block, data: dict, layout: VdfLayout, edits: list) -> None:
+    '''private: Adds the edits needed to change the block in the file to match data.\n
+       Each edit is (start, end, replacement text).'''
+
+    for key, child in block.children.items():
+        if key not in data:
+            edits.append((child.start, child.end, ""))
+
+    # New keys go at the end of the block, the same as vdf.dump would put them
+    insert_indent = block.indent + "\t"
+    if block.children:
+        insert_indent = list(block.children.values())[-1].indent
+
+    for key, value in data.items():
+        child = block.children.get(key)
+
+        if child is None:
+            text = _format(key, value, insert_indent, layout)
+            # The root block may not end with a newline
+            if block.close_start == len(layout.text) and not layout.text.endswith("\n") \
+                and layout.text:
+                text = layout.newline + text
+            edits.append((block.close_start, block.close_start, text))
+
+        elif isinstance(child, _Value) and not isinstance(value, dict):
+            if child.value != str(value):
+                edits.append((child.value_start, child.value_end, f'"{_escape(str(value))}"'))
+
+        elif isinstance(child, _Block) and isinstance(value, dict) \
+            and child.close_start is not None and not child.duplicates:
+            _diff_block(child, value, layout, edits)
+
+        else:
+            # Changed between a value and a block, or too complex to edit, so replace all of it
+            edits.append((child.start, child.end, _format(key, value, child.indent, layout)))
+
+
+def patch_vdf(layout: VdfLayout, data: dict) -> str:
+    '''Gets the text of the file with only the parts which differ from data changed.\n
+       Returns None if the file can't be patched, and needs to be written in full instead.'''
+
+    if layout.root.duplicates:
+        return None
+
+    edits = []
+    _diff_block(layout.root, data, layout, edits)
+
+    # Edits at the same position are kept in the order they were added
+    edits.sort(key=lambda edit: edit[0])
+
+    output = []
+    position = 0
+    for (start, end, text) in edits:
+        output.append(layout.text[position:start])
+        output.append(text)
+        position = end
+    output.append(layout.text[position:])
+
+    return "".join(output)
+
+
+def write_atomic(path: str, text: str) -> None:
+    '''Writes the text to the path, so that the file is either fully written or not changed.'''
+
+    directory = os.path.dirname(os.path.abspath(path))
+    (temp_fd, temp_path) = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+
+    try:
+        with os.fdopen(temp_fd, mode="w", encoding="utf-8", newline="") as temp_file:
+            temp_file.write(text)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+
+        if os.path.exists(path):
+            shutil.copymode(path, temp_path)
+        os.replace(temp_path, path)
+    except:
+        os.remove(temp_path)
+        raise